@@ -1,6 +1,7 @@
 #from w3lib.html import get_base_url
 from src.Classes.profileYmlToDict import tranform_yml_to_dict
 from src.Classes.profileYmlToDict import separateSpecAndMapping
+import copy
 import itertools
 import json
 import os
@@ -16,19 +17,48 @@ sys.path.append("./")
 import src.Classes.config as config
 from jsonschema import Draft7Validator
 
+# the files the profiles are built from, other than the profile yml files
+DEFINITIONS_LOC = "src/Classes/definitions.txt"
+TYPE_VALUE_DICT_LOC = "src/Classes/typeValueDict.txt"
+
 def lowerFirstLetter(string):
     return string[0].lower() + string[1:]
+class BuildContext:
+    """The state of the build of one profile, so several profiles can be built at the same time."""
+
+    def __init__(self, filepath, released=None):
+        """
+        Args:
+            filepath (Path): The profile yml file being built
+            released (dict): The profile names with a released version and the file name of the version that
+                             is referenced, None to look for them in config.PROFILE_LOC
+        """
+        self.filepath = filepath
+        self.outputName = pathlib.Path(filepath.name).stem + config.PROFILE_EXT
+        # config.PROFILE_LOC is only looked at once per build
+        self.released = released if released is not None else released_profiles()
+        # the ref dicts already made, by type name and whether the property has a controlled vocabulary
+        self.refs = dict()
+        # the profile type, then the name of the property being made
+        self.title = None
+        self.definitions = read_definition()
+        self.typeValueDict = read_typeValueDict()
+        self.requiredProperties = list()
+        self.recommendedProperties = list()
+        self.optionalProperties = list()
+
 # build a json-LD profile from information in a text file
 # as the validator is using profile from text file in form of python dict
     # read a profile data file into a list
-global filepath
-global title
-def build_profile(path):
+def build_profile(path, released=None):
+    """Build the JSON schema and the marginality list of a profile yml file
+
+    Args:
+        path (Path): The profile yml file
+        released (dict): The released profiles to reference, see BuildContext, None to look in config.PROFILE_LOC
+    """
     try:
-        global filepath
-        global outputName
         filepath = path
-        outputName = pathlib.Path(filepath.name).stem + config.PROFILE_EXT
     #         filepath.parent.mkdir(parents=True, exist_ok=True)
         file = filepath.read_text()
         specInfo, mapping = separateSpecAndMapping(file)
@@ -36,9 +66,9 @@ def build_profile(path):
             click.secho(
                 "Something in the profile yml file does not follow the format, the json schema will not be made.", fg="red")
             return -1
-        read_definition()
-        read_typeValueDict()
-        dictMade = produce_dict(specInfo, mapping)
+        context = BuildContext(filepath, released)
+        write_schema_org_types(context.typeValueDict)
+        dictMade = produce_dict(specInfo, mapping, context)
         print_dict(dictMade, filepath)
         Draft7Validator.check_schema(dictMade)
         click.secho("Done", fg='green')
@@ -60,38 +90,33 @@ def build_profile(path):
         return -1
 
 def read_definition():
-    global definitions
-    file = pathlib.Path("src/Classes/definitions.txt").read_text()
+    file = pathlib.Path(DEFINITIONS_LOC).read_text()
 
-    definitions = json.loads(file)
+    return json.loads(file)
 
 
 
 def read_typeValueDict():
-    global typeValueDict
-    file = pathlib.Path("src/Classes/typeValueDict.txt").read_text()
+    file = pathlib.Path(TYPE_VALUE_DICT_LOC).read_text()
 
-    typeValueDict = json.loads(file)
+    return json.loads(file)
 
-def produce_dict(specInfo, mapping):
+def produce_dict(specInfo, mapping, context):
     """Use the information extracted from the yml file to build a json schemas
 
     Args:
         specInfo (str): specification of the profile
         mapping (str): all the properties in the profile
+        context (BuildContext): The state of this build
     """    
-    global requiredProperties
-    global recommendedProperties
-    global optionalProperties
-
     # initialize lists
-    requiredProperties = list()
-    recommendedProperties = list()
-    optionalProperties = list()
+    requiredProperties = context.requiredProperties
+    recommendedProperties = context.recommendedProperties
+    optionalProperties = context.optionalProperties
 
     # initialize python dict
-    dictMade = make_profile_spec(specInfo)
-    dictMade["$defs"] = definitions
+    dictMade = make_profile_spec(specInfo, context)
+    dictMade["$defs"] = context.definitions
     dictMade["required"] = list()
     dictMade["properties"] = dict()
 
@@ -109,19 +134,18 @@ def produce_dict(specInfo, mapping):
         elif "marginality: Optional" in propertyInfo:
             optionalProperties.append(propertyName.strip())
 
-        individualProp = make_property(propertyInfo, propertyName)
+        individualProp = make_property(propertyInfo, propertyName, context)
         dictMade["properties"][propertyName.replace(" ", "")] = individualProp
 
 
-    completenessListFile(requiredProperties, recommendedProperties, optionalProperties)
-    dictMade["$defs"] = definitions
+    completenessListFile(requiredProperties, recommendedProperties, optionalProperties, context.filepath)
+    dictMade["$defs"] = context.definitions
 
     return(dictMade)
     
 
 
-def completenessListFile(required, recommended, optional):
-    global filepath
+def completenessListFile(required, recommended, optional, filepath):
 
     outputName = pathlib.Path(filepath.name).stem + config.PROFILE_MARG_EXT
     outputDir = pathlib.Path(config.PROFILE_MARG_LOC)
@@ -143,13 +167,12 @@ def completenessListFile(required, recommended, optional):
     f.close()
 
 
-def make_profile_spec(specInfo):
-    global title
+def make_profile_spec(specInfo, context):
     dictMade = {}
     for line in specInfo.splitlines():
         if "  title: " in line:
             dictMade["@type"] = line.split("title: ")[1].strip()
-            title = dictMade["@type"]
+            context.title = dictMade["@type"]
         elif "  version:" in line:
             dictMade["version"] = line.split("version: ")[1].strip()
             break
@@ -159,9 +182,8 @@ def make_profile_spec(specInfo):
     dictMade["@context"] = "http://schema.org"
     return dictMade
 
-def make_property(propertyInfo, propertyName):
-    global title
-    title = propertyName
+def make_property(propertyInfo, propertyName, context):
+    context.title = propertyName
     # as the profile data starts with requiredm if there's no key required
     # in the dictionary, we are at the first property
     currentDict = {}
@@ -199,10 +221,10 @@ def make_property(propertyInfo, propertyName):
         arrayDict["items"]["anyOf"] = list()
         currentDict["validityCheck"] = multiShemas
         for item in propertyDict["expected_types"]:
-            returned_ref = return_ref_dict(item, controlledVocab)
+            returned_ref = return_ref_dict(item, controlledVocab, context)
             currentDict["anyOf"].append(returned_ref)
             currentDict["validityCheck"] = currentDict["validityCheck"] + returned_ref["validityCheck"] + ", "
-            arrayDict["items"]["anyOf"] .append(return_ref_dict(item, controlledVocab))
+            arrayDict["items"]["anyOf"] .append(copy.deepcopy(returned_ref))
 
 
     elif ManyOrNone and len(propertyDict["expected_types"])==1:
@@ -210,8 +232,8 @@ def make_property(propertyInfo, propertyName):
         arrayDict = dict()
         arrayDict["type"] = "array"
         currentDict["anyOf"].append(arrayDict)
-        arrayDict["items"] = return_ref_dict(propertyDict["expected_types"][0], controlledVocab)
-        currentDict["anyOf"].append(return_ref_dict(propertyDict["expected_types"][0], controlledVocab))
+        arrayDict["items"] = return_ref_dict(propertyDict["expected_types"][0], controlledVocab, context)
+        currentDict["anyOf"].append(copy.deepcopy(arrayDict["items"]))
         currentDict["validityCheck"] = singleSchema + currentDict["anyOf"][1]["validityCheck"] + " in an array or as a single object"
 
     elif propertyDict["cardinality"] == "ONE" and len(propertyDict["expected_types"])>1:
@@ -225,10 +247,10 @@ def make_property(propertyInfo, propertyName):
         currentDict["validityCheck"] = multiShemas
 
         for item in propertyDict["expected_types"]:
-            returned_ref = return_ref_dict(item, controlledVocab)
+            returned_ref = return_ref_dict(item, controlledVocab, context)
             currentDict["anyOf"].append(returned_ref)
             currentDict["validityCheck"] = currentDict["validityCheck"] + returned_ref["validityCheck"] + ", "
-            arrayDict["items"]["anyOf"] .append(return_ref_dict(item, controlledVocab))
+            arrayDict["items"]["anyOf"] .append(copy.deepcopy(returned_ref))
 
     elif propertyDict["cardinality"] == "ONE" and len(propertyDict["expected_types"])==1:
         currentDict["anyOf"] = list()
@@ -236,8 +258,8 @@ def make_property(propertyInfo, propertyName):
         arrayDict["type"] = "array"
         arrayDict["maxItems"] = 1
         currentDict["anyOf"].append(arrayDict)
-        arrayDict["items"] = return_ref_dict(propertyDict["expected_types"][0], controlledVocab)
-        currentDict["anyOf"].append(return_ref_dict(propertyDict["expected_types"][0], controlledVocab))
+        arrayDict["items"] = return_ref_dict(propertyDict["expected_types"][0], controlledVocab, context)
+        currentDict["anyOf"].append(copy.deepcopy(arrayDict["items"]))
         currentDict["validityCheck"] = singleSchema + currentDict["anyOf"][1]["validityCheck"] + " in an array or as a single object"
 
 
@@ -245,95 +267,58 @@ def make_property(propertyInfo, propertyName):
         currentDict["validityCheck"] = currentDict["validityCheck"].rstrip(", ")
     return currentDict
 
-def simplifyingDef(dictNeeded):
-    global title
-    if type(dictNeeded) is dict:
-        for key, value in dictNeeded.items():
-            # if the property reference to another shemas
-            if "$ref" == key:
-                if value == title:
-                    dictNeeded["$ref"] = "#/"
-                elif value in definitions.keys():
-                    dictNeeded["$ref"] = "#/$defs/" + value
-            elif type(value) is dict or list:
-                simplifyingDef(dictNeeded[key])
-    elif type(dictNeeded) is list:
-        for item in dictNeeded:
-            simplifyingDef(item)
-
-
-def return_ref_dict(name, controlledVocab):
-    global title
-    ref = dict()
+def released_profiles():
+    """Return the profiles in config.PROFILE_LOC with a released version, and the file name of the version referenced"""
     filepath = pathlib.Path(config.PROFILE_LOC)
     if filepath.exists() != True:
         filepath.mkdir(parents=True)
-    existProfile = list()
+    released = dict()
     for child in filepath.iterdir():
         if child.is_dir():
-            for profiledes in child.iterdir():
-                if str(profiledes.name).find("RELEASE") != -1:
-#                         existProfileName.append(child)
-                    existProfile.append(child)
-    if name == title:
+            releases = sorted(child.glob("*RELEASE*" + config.PROFILE_EXT))
+            if len(releases) != 0:
+                released[child.name] = releases[0].name
+    return released
+
+def return_ref_dict(name, controlledVocab, context):
+    """Return the schema of an expected type, made once per build for each type
+
+    Args:
+        name (str): The expected type
+        controlledVocab (bool): True if the property has a controlled vocabulary
+        context (BuildContext): The state of this build
+    """
+    # the profile type is only a link to this profile when it is the title, see make_property
+    if name == context.title:
+        return make_ref_dict(name, controlledVocab, context)
+    key = (name, controlledVocab)
+    if key not in context.refs:
+        context.refs[key] = make_ref_dict(name, controlledVocab, context)
+    # a copy, as the same type is in the profile several times
+    return copy.deepcopy(context.refs[key])
+
+def make_ref_dict(name, controlledVocab, context):
+    ref = dict()
+    released = context.released
+    if name == context.title:
         ref["$ref"] = "#/"
         ref["validityCheck"] = "profile type \"" + name + "\""
 
     # if the reference type is one of the profile with a released version
-    # the profile name would be in the existProfile list
-    elif filepath.joinpath(pathlib.Path(name)) in existProfile:
-        profileReleased = sorted(filepath.joinpath(pathlib.Path(name)).glob("*RELEASE*"))[0]
+    elif name in released:
+        profileReleased = released[name]
 #             print(profileReleased)
-        f = profileReleased.read_text()
-        definitions[name] = json.loads(f)
-        ref["$ref"] = "#/$defs/" + name
-        ref["validityCheck"] = "profile type \"" + name + "\", version " +  str(pathlib.Path(profileReleased.name).stem)
-        # check if the definition in the profile already exist in $def
-        same = set(list(definitions.keys())).intersection(list(definitions[name]["$defs"].keys()))
-        for s in same:
-            del  definitions[name]["$defs"][s]
-
-        # if the title profile is a definition in a ref profile,
-        # remove it from the def in ref and replace all ref link to point
-        # to the title profile instead
-        if title in list(definitions[name]["$defs"].keys()):
-            del  definitions[name]["$defs"][title]
-            simplifyingDef(definitions[name]["properties"])
-    elif name in definitions.keys():
+        # the released profile is not copied into this profile, the $ref links to its own file in config.PROFILE_LOC
+        # relative to the directory of this profile, the validator loads it once for all the profiles that use it
+        ref["$ref"] = "../" + name + "/" + profileReleased
+        ref["validityCheck"] = "profile type \"" + name + "\", version " +  str(pathlib.Path(profileReleased).stem)
+    elif name in context.definitions.keys():
         ref["$ref"] = "#/$defs/" + name
         ref["validityCheck"] = "type \"" + name + "\""
-    elif name in typeValueDict.keys():
-        ref["type"] = "object"
-        ref["validityCheck"] = "schema.org type \"" + name + "\""
-        ref["properties"] = dict()
-        ref["properties"]["@type"] = dict()
-        ref["properties"]["@type"]["anyOf"] = list()
-
-        enum = typeValueDict[name]
-
-        arrayType = dict()
-        arrayType["type"] = "array"
-        arrayType["items"] = dict()
-        arrayType["items"]["enum"] = enum
-
-        singleType = dict()
-        singleType["enum"] = enum
-
-        ref["properties"]["@type"]["anyOf"].append(arrayType)
-        ref["properties"]["@type"]["anyOf"].append(singleType)
-
-        # ref["properties"]["@type"]["enum"] = typeValueDict[name]
-        ref["properties"]["@type"]["validityCheck"] = "schema.org type or subtype of\"" + name + "\""
-    elif name == "Thing":
-        ref["type"] = "object"
-        ref["validityCheck"] = "schema.org or subtype of \"" + name + "\""
-        ref["properties"] = dict()
-        ref["properties"]["@type"] = dict()
-        thingList = list(typeValueDict.values())
-        # thingList = list(set(thingList))
-        thingList = list(itertools.chain.from_iterable(thingList))
-        ref["properties"]["@type"]["enum"] = thingList
-        ref["properties"]["@type"]["validityCheck"] = "schema.org type or subtype of \"" + name + "\""
+    elif name in context.typeValueDict.keys() or name == "Thing":
+        # the lists of schema.org subtypes are written once in the schema.org types file, see write_schema_org_types
+        ref["$ref"] = "../" + config.PROFILE_TYPES_NAME + config.PROFILE_EXT + "#/$defs/" + name
+        ref["validityCheck"] = schema_org_type_dict(name, context.typeValueDict)["validityCheck"]
     elif name == "Text":
         ref["type"] = "string"
         # ref["minLength"] = 1
@@ -375,6 +360,69 @@ def return_ref_dict(name, controlledVocab):
             ref["properties"]["url"] = {"$ref": "#/$defs/URL"}
     return ref
 
+def schema_org_type_dict(name, typeValueDict):
+    """Return the schema of a schema.org type that accepts the type or any of its subtypes
+
+    Args:
+        name (str): "Thing" or a type in typeValueDict
+        typeValueDict (dict): The schema.org types and their subtypes, from typeValueDict.txt
+    """
+    ref = dict()
+    if name == "Thing":
+        ref["type"] = "object"
+        ref["validityCheck"] = "schema.org or subtype of \"" + name + "\""
+        ref["properties"] = dict()
+        ref["properties"]["@type"] = dict()
+        thingList = list(typeValueDict.values())
+        # thingList = list(set(thingList))
+        thingList = list(itertools.chain.from_iterable(thingList))
+        ref["properties"]["@type"]["enum"] = thingList
+        ref["properties"]["@type"]["validityCheck"] = "schema.org type or subtype of \"" + name + "\""
+        return ref
+
+    ref["type"] = "object"
+    ref["validityCheck"] = "schema.org type \"" + name + "\""
+    ref["properties"] = dict()
+    ref["properties"]["@type"] = dict()
+    ref["properties"]["@type"]["anyOf"] = list()
+
+    enum = typeValueDict[name]
+
+    arrayType = dict()
+    arrayType["type"] = "array"
+    arrayType["items"] = dict()
+    arrayType["items"]["enum"] = enum
+
+    singleType = dict()
+    singleType["enum"] = enum
+
+    ref["properties"]["@type"]["anyOf"].append(arrayType)
+    ref["properties"]["@type"]["anyOf"].append(singleType)
+
+    # ref["properties"]["@type"]["enum"] = typeValueDict[name]
+    ref["properties"]["@type"]["validityCheck"] = "schema.org type or subtype of\"" + name + "\""
+    return ref
+
+def write_schema_org_types(typeValueDict):
+    """Write the schemas of the schema.org types in typeValueDict and of Thing to one file in config.PROFILE_LOC.
+    The profiles link to them with a $ref instead of each having a copy of the lists of subtypes.
+    """
+    typesDict = dict()
+    typesDict["$schema"] = "http://json-schema.org/draft-07/schema#"
+    typesDict["$defs"] = dict()
+    for name in list(typeValueDict.keys()) + ["Thing"]:
+        typesDict["$defs"][name] = schema_org_type_dict(name, typeValueDict)
+    pretty_json = json.dumps(typesDict, indent=2)
+
+    resultPath = pathlib.Path(config.PROFILE_LOC).joinpath(config.PROFILE_TYPES_NAME + config.PROFILE_EXT)
+    resultPath.parent.mkdir(parents=True, exist_ok=True)
+    if resultPath.exists() and resultPath.read_text() == pretty_json:
+        return
+    # replaced in one step, so a validation never reads half of the file
+    temporaryPath = resultPath.with_suffix("." + str(os.getpid()) + ".tmp")
+    temporaryPath.write_text(pretty_json)
+    os.replace(temporaryPath, resultPath)
+
 def remove_duplicate_in_list(x):
     return list(dict.fromkeys(x))
 
@@ -0,0 +1,287 @@
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pathlib
+
+import click
+
+import src.Classes.config as config
+from src.Classes.buildAProfile import build_profile
+from src.Classes.buildAProfile import released_profiles
+from src.Classes.buildAProfile import read_typeValueDict
+from src.Classes.buildAProfile import write_schema_org_types
+from src.Classes.buildAProfile import DEFINITIONS_LOC
+from src.Classes.buildAProfile import TYPE_VALUE_DICT_LOC
+from src.Classes.profileYmlToDict import separateSpecAndMapping
+from src.Classes.profileYmlToDict import tranform_yml_to_dict
+
+
+# change when the builder makes different profiles from the same files, so the manifest builds them all again
+MANIFEST_VERSION = 1
+
+
+def profile_name(path):
+    """Return the name of the profile a yml file is a version of, the directory its json schema is saved in"""
+    return path.parts[1]
+
+
+def referenced_types(path):
+    """Return the expected types of all the properties of a profile yml file, empty if the file cannot be read"""
+    try:
+        specInfo, mapping = separateSpecAndMapping(path.read_text())
+    except OSError:
+        return set()
+    if mapping is None:
+        return set()
+    types = set()
+    for propertyInfo in filter(None, mapping.split("- property: ")[1:]):
+        propertyDict = tranform_yml_to_dict(propertyInfo)
+        types.update(propertyDict.get("expected_types", []))
+    return types
+
+
+def planned_releases(paths):
+    """Return the released profiles once the build is done: the ones already in config.PROFILE_LOC and the
+    RELEASE yml files about to be built, with the file name that will be referenced for each of them.
+    The profiles are built from this index instead of what is on the disk, so the result does not depend on the order.
+    """
+    releases = dict()
+    for name, fileName in released_profiles().items():
+        releases.setdefault(name, set()).add(fileName)
+    for path in paths:
+        if "RELEASE" in path.name:
+            releases.setdefault(profile_name(path), set()).add(path.stem + config.PROFILE_EXT)
+    return {name: sorted(fileNames)[0] for name, fileNames in releases.items()}
+
+
+def dependency_graph(paths):
+    """Link each profile yml file to the RELEASE yml files of the profiles its properties reference
+
+    Args:
+        paths (list): The profile yml files to build
+
+    Returns:
+        dict: Each path and the set of paths that have to be built before it
+    """
+    releasedBy = dict()
+    for path in paths:
+        if "RELEASE" in path.name:
+            releasedBy.setdefault(profile_name(path), set()).add(path)
+    graph = dict()
+    for path in paths:
+        graph[path] = set()
+        for name in referenced_types(path):
+            graph[path].update(releasedBy.get(name, set()))
+        graph[path].discard(path)
+    return graph
+
+
+def build_levels(graph):
+    """Order a dependency graph in levels, each level only depends on the levels before it.
+    The profiles referencing each other are put in the same level.
+
+    Args:
+        graph (dict): Each node and the set of nodes it depends on
+
+    Returns:
+        list: The levels, each a sorted list of nodes
+    """
+    # the strongly connected components, found with Tarjan's algorithm without recursion
+    index = dict()
+    lowlink = dict()
+    stack = list()
+    onStack = set()
+    component = dict()
+    components = list()
+    for start in sorted(graph):
+        if start in index:
+            continue
+        work = [(start, iter(sorted(graph[start])))]
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        onStack.add(start)
+        while work:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is not None:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    onStack.add(child)
+                    work.append((child, iter(sorted(graph[child]))))
+                elif child in onStack:
+                    lowlink[node] = min(lowlink[node], index[child])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                members = list()
+                while True:
+                    member = stack.pop()
+                    onStack.discard(member)
+                    component[member] = len(components)
+                    members.append(member)
+                    if member == node:
+                        break
+                components.append(members)
+
+    # Tarjan's algorithm finds the components after all the ones they depend on
+    level = list()
+    for members in components:
+        dependencies = {component[dependency] for member in members for dependency in graph[member]}
+        dependencies.discard(component[members[0]])
+        level.append(max((level[dependency] + 1 for dependency in dependencies), default=0))
+    levels = [list() for _ in range(max(level, default=-1) + 1)]
+    for number, members in enumerate(components):
+        levels[level[number]].extend(members)
+    return [sorted(members) for members in levels]
+
+
+def file_digest(path):
+    """Return the sha256 of a file, None if it does not exist"""
+    try:
+        return hashlib.sha256(pathlib.Path(path).read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def output_paths(path):
+    """Return the json schema and the marginality file built from a profile yml file, see print_dict"""
+    stem = pathlib.Path(path.name).stem
+    return [pathlib.Path(config.PROFILE_LOC, profile_name(path), stem + config.PROFILE_EXT),
+            pathlib.Path(config.PROFILE_MARG_LOC, profile_name(path), stem + config.PROFILE_MARG_EXT)]
+
+
+class BuildManifest:
+    """Records what each profile was built from and the files made, so the next builds skip the profiles that did not change.
+
+    The inputs of a profile are its yml file, definitions.txt, typeValueDict.txt, the released versions of the
+    profiles it references and the yml files of the RELEASE profiles it depends on, so a profile is built again
+    when one of them changes. A profile is also built again if its files were changed or removed since.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str/Path): The manifest file, read if it exists
+        """
+        self.path = pathlib.Path(path)
+        self.entries = dict()
+        if self.path.exists():
+            try:
+                manifest = json.loads(self.path.read_text())
+            except ValueError:
+                manifest = dict()
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.entries = manifest["profiles"]
+        self._shared = {"definitions": file_digest(DEFINITIONS_LOC),
+                        "typeValueDict": file_digest(TYPE_VALUE_DICT_LOC)}
+
+    def inputs(self, path, released, dependencies):
+        """Return the digest of everything the profile yml file is built from
+
+        Args:
+            path (Path): The profile yml file
+            released (dict): The released profiles referenced, see BuildContext
+            dependencies (set): The RELEASE yml files the profile depends on
+        """
+        inputs = dict(self._shared)
+        inputs["yml"] = file_digest(path)
+        inputs["released"] = {name: released[name] for name in referenced_types(path) if name in released}
+        inputs["dependencies"] = {dependency.as_posix(): file_digest(dependency) for dependency in dependencies}
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def up_to_date(self, path, inputs):
+        """Return True if the profile was built from the same inputs and its files are unchanged"""
+        entry = self.entries.get(path.as_posix())
+        if entry is None or entry["inputs"] != inputs:
+            return False
+        return all(file_digest(output) == entry["outputs"].get(output.as_posix()) for output in output_paths(path))
+
+    def record(self, path, inputs):
+        """Record that the profile was built from inputs"""
+        self.entries[path.as_posix()] = {
+            "inputs": inputs,
+            "outputs": {output.as_posix(): file_digest(output) for output in output_paths(path)}}
+
+    def save(self):
+        """Write the manifest, without the profile yml files that were removed"""
+        self.entries = {path: entry for path, entry in self.entries.items() if pathlib.Path(path).exists()}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix("." + str(os.getpid()) + ".tmp")
+        temporary.write_text(json.dumps({"version": MANIFEST_VERSION, "profiles": self.entries},
+                                        indent=2, sort_keys=True))
+        os.replace(temporary, self.path)
+
+
+def build_captured(path, released):
+    """Build a profile in a worker process and keep what it displays so it can be shown in order
+
+    Returns:
+        tuple: The code returned by build_profile and the output of the build
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        code = build_profile(path, released)
+    return code, output.getvalue()
+
+
+def build_profiles(paths, workers=1, rebuild=False):
+    """Build the profile yml files, the RELEASE profiles referenced by the others first.
+    With more than one worker, the profiles of a level are built in parallel worker processes.
+    The profiles that did not change since they were last built are skipped, see BuildManifest.
+
+    Args:
+        paths (list): The profile yml files to build
+        workers (int): The number of worker processes, 1 to build them one by one in this process
+        rebuild (boolean): True to build all the profiles, even those that did not change
+
+    Returns:
+        dict: The code returned by build_profile for each path built
+    """
+    paths = [pathlib.Path(path) for path in paths]
+    released = planned_releases(paths)
+    graph = dependency_graph(paths)
+    manifest = BuildManifest(pathlib.Path(config.PROFILE_LOC, config.BUILD_MANIFEST_NAME + config.PROFILE_EXT))
+    inputs = {path: manifest.inputs(path, released, graph[path]) for path in paths}
+    if rebuild:
+        levels = build_levels(graph)
+    else:
+        changed = {path for path in paths if not manifest.up_to_date(path, inputs[path])}
+        # the dependencies that are up to date are already built
+        levels = build_levels({path: graph[path] & changed for path in changed})
+    # the profiles built link to the schema.org types file, made again here if it was removed
+    write_schema_org_types(read_typeValueDict())
+
+    codes = dict()
+    try:
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                for members in levels:
+                    results = pool.map(build_captured, members, [released]*len(members))
+                    for path, (code, output) in zip(members, results):
+                        click.echo(path)
+                        click.echo(output, nl=False)
+                        click.echo("---------------------------------")
+                        codes[path] = code
+                        if code == 0:
+                            manifest.record(path, inputs[path])
+        else:
+            for members in levels:
+                for path in members:
+                    click.echo(path)
+                    codes[path] = build_profile(path, released)
+                    click.echo("---------------------------------")
+                    if codes[path] == 0:
+                        manifest.record(path, inputs[path])
+    finally:
+        manifest.save()
+    skipped = len(paths) - len(codes)
+    if skipped != 0:
+        click.secho(str(skipped) + " profile(s) did not change since they were built and were skipped, use --rebuild to build them again", fg="green")
+    return codes
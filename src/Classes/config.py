@@ -1,3 +1,5 @@
+import os
+
 # location and file extension keywords
 # needs to be a string
 # any EXT(file extension) need to include a dot
@@ -5,8 +7,50 @@
 YML_LOC = "profile_yml"
 PROFILE_EXT = ".json"
 PROFILE_LOC = "profile_json"
+# name of the file in PROFILE_LOC with the schemas of the schema.org types shared by the profiles
+PROFILE_TYPES_NAME = "schemaOrgTypes"
+# name of the file in PROFILE_LOC recording what each profile was built from, to only build the profiles that changed
+BUILD_MANIFEST_NAME = "buildManifest"
 METADATA_EXT = ".jsonld"
 METADATA_LOC = "profileLive"
 PROFILE_MARG_EXT = ".txt"
 PROFILE_MARG_LOC = "profile_marginality"
 METADATA_DEFAULT_PROP = "src/Classes/metadataDefaultPropName.txt"
+
+# number of profile JSON schemas kept compiled in memory during a validation run
+VALIDATOR_CACHE_SIZE = 32
+
+# file extension of the Python source compiled from a profile JSON schema, kept next to the profile
+# "" to validate with jsonschema instead
+PROFILE_COMPILED_EXT = ".py"
+
+# file extensions of JSON Lines files, one metadata per line
+JSON_LINES_EXT = [".jsonl", ".ndjson"]
+
+# number of rows written to the summary csv file of a batch between two flushes to the disk
+CSV_FLUSH_ROWS = 1000
+
+# downloading the webpages to extract the static JSON-LD from
+# number of webpages downloaded at the same time
+HTTP_CONCURRENCY = 8
+# seconds to wait for a server to connect or to send data
+HTTP_TIMEOUT = 30
+# number of times a request is sent again after a connection error or a 429/5xx response
+HTTP_RETRIES = 3
+# seconds waited before the first retry, doubled at each retry
+HTTP_BACKOFF = 0.5
+# directory of the webpages kept between runs to send conditional requests, "" to always download them in full
+# in the user cache directory, $XDG_CACHE_HOME or ~/.cache, rather than the directory the validator is run from
+HTTP_CACHE_LOC = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                              "bioschemas-validator", "httpCache")
+# number of bytes of webpages kept in the cache before the least recently used ones are removed
+HTTP_CACHE_SIZE = 512 * 1024 * 1024
+# sitemaps looked for on a website whose robots.txt does not list any
+SITEMAP_LOCATIONS = ["sitemap.xml", "sitemap_index.xml"]
+# local HTML files of at least this number of bytes are memory-mapped instead of read, 0 to always read them
+LOCAL_HTML_MMAP_SIZE = 16 * 1024 * 1024
+
+# the serve action, validating the metadata sent over HTTP with the profiles kept in memory
+# the server only listens on this address so it is not reachable from other machines
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
@@ -0,0 +1,93 @@
+import csv
+import pathlib
+
+import click
+
+FIELDNAMES = ["File Name", "Profile Name", "Profile Version",
+              "Valid", "Minimum", "Recommended", "Optional"]
+
+
+def csvRow(resultdict, name):
+    """Turn the marginality result of a validation into a csv row, resultdict is not changed
+
+    Args:
+        resultdict (dict): A dict of the validation result with keys as "Minimum", "Recommended" and "Optional"
+        name (string): The name of the file that the validation report is for
+
+    Returns:
+        dict: The row with one cell per marginality, each line of the cell being "Missing", "Implemented" or "Error"
+    """
+    row = dict(resultdict)
+    row["File Name"] = name
+    for keyName in ["Minimum", "Recommended", "Optional"]:
+        if keyName in row:
+            newString = ""
+            for k, v in row[keyName].items():
+                newString = newString + "\n" + k + ": " + str(v)
+            row[keyName] = newString.strip()
+    return row
+
+
+class CsvSummaryWriter:
+    """Writes the csv row of each validation result to a single summary file as the results arrive.
+
+    The file is created next to the first metadata that has a result and replaces any previous summary,
+    so its content only depends on the metadata validated.
+    """
+
+    def __init__(self, fileName, flushRows):
+        """
+        Args:
+            fileName (str): The name of the summary file, such as mergedResult.csv
+            flushRows (int): The number of rows written between two flushes to the disk
+        """
+        self.fileName = fileName
+        self.flushRows = flushRows
+        self.path = None
+        self.rows = 0
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def writerow(self, resultdict, name):
+        """Add the result of a validation to the summary
+
+        Args:
+            resultdict (dict): The marginality result returned by validator.validate
+            name (string/Path): The path to the metadata validated
+
+        Returns:
+            int: 1 if a row was written, 0 if there is no marginality result
+        """
+        if resultdict == 0 or resultdict is None:
+            if resultdict == 0:
+                click.echo("This profile has no list of properties and marginality. No csv row is made")
+            return 0
+        if self._file is None:
+            self.path = pathlib.Path(name).parent.joinpath(self.fileName)
+            self._file = self.path.open("w", newline="")
+            self._writer = csv.writer(self._file)
+            # the first column is the row number
+            self._writer.writerow([""] + FIELDNAMES)
+        row = csvRow(resultdict, name)
+        self._writer.writerow([self.rows] + [row.get(field, "") for field in FIELDNAMES])
+        self.rows += 1
+        if self.rows % self.flushRows == 0:
+            self._file.flush()
+        return 1
+
+    def close(self):
+        """Close the summary file
+
+        Returns:
+            Path: The path to the summary file, None if no row was written
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.path
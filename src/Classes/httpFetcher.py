@@ -0,0 +1,213 @@
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# responses that are worth asking for again, as the server is busy or failed for a moment
+RETRY_STATUS = [429, 500, 502, 503, 504]
+
+# the text of a webpage, the url it was downloaded from after the redirections and whether it came from the cache
+FetchedPage = collections.namedtuple("FetchedPage", ["text", "url", "status", "cached"])
+
+
+class HttpCache:
+    """An on-disk cache of the webpages downloaded, keyed by url, kept between runs.
+
+    The text of each webpage is saved with its ETag and Last-Modified headers so it can be
+    revalidated with a conditional request. Only webpages with one of these headers are kept.
+    When the cache is larger than maxsize bytes, the least recently used webpages are removed.
+    """
+
+    def __init__(self, directory, maxsize):
+        """
+        Args:
+            directory (str/Path): The directory of the cache, created if needed
+            maxsize (int): The number of bytes of webpages kept in the cache
+        """
+        self.directory = pathlib.Path(directory)
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._indexPath = self.directory / "index.json"
+        self._entries = collections.OrderedDict()
+        if self._indexPath.exists():
+            # the index is saved from the least to the most recently used webpage
+            for url, entry in json.loads(self._indexPath.read_text()):
+                if (self.directory / entry["file"]).exists():
+                    self._entries[url] = entry
+        self._size = sum(entry["size"] for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def headers(self, url):
+        """Return the headers of a conditional request for url, empty if the url is not in the cache"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return dict()
+            headers = dict()
+            if entry["etag"] is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["lastModified"] is not None:
+                headers["If-Modified-Since"] = entry["lastModified"]
+            return headers
+
+    def get(self, url):
+        """Return the FetchedPage saved for url, None if it is not in the cache"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            self._entries.move_to_end(url)
+        try:
+            text = (self.directory / entry["file"]).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        return FetchedPage(text, entry["url"], 200, True)
+
+    def put(self, url, response):
+        """Save the text of a response of the server for url if it has an ETag or Last-Modified header"""
+        etag = response.headers.get("ETag")
+        lastModified = response.headers.get("Last-Modified")
+        if etag is None and lastModified is None:
+            return
+        body = response.text.encode("utf-8")
+        if len(body) > self.maxsize:
+            return
+        fileName = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / fileName).write_bytes(body)
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old is not None:
+                self._size -= old["size"]
+            self._entries[url] = {"file": fileName, "url": response.url, "etag": etag,
+                                  "lastModified": lastModified, "size": len(body)}
+            self._size += len(body)
+            while self._size > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted["size"]
+                (self.directory / evicted["file"]).unlink(missing_ok=True)
+
+    def save(self):
+        """Write the index of the cache to the disk, needed for the next runs to find the webpages"""
+        with self._lock:
+            if len(self._entries) == 0 and not self._indexPath.exists():
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # named after the process, the runs sharing the cache directory each replace the index in one step
+            temporary = self._indexPath.with_suffix("." + str(os.getpid()) + ".tmp")
+            temporary.write_text(json.dumps(list(self._entries.items())))
+            os.replace(temporary, self._indexPath)
+
+
+class HttpFetcher:
+    """Downloads webpages over a pooled, keep-alive session with a limited number of requests at the same time.
+
+    Each request has a timeout and is retried with an exponential backoff on connection errors
+    and on the status codes in RETRY_STATUS. With an HttpCache, the webpages already downloaded
+    are asked for again with a conditional request and read from the cache if they did not change.
+    """
+
+    def __init__(self, concurrency, timeout, retries, backoff, cache=None):
+        """
+        Args:
+            concurrency (int): The number of requests sent at the same time
+            timeout (float): The number of seconds to wait for the server to connect or send data
+            retries (int): The number of times a failed request is sent again
+            backoff (float): The wait before the first retry in seconds, doubled at each retry
+            cache (HttpCache): The cache of the webpages, None to always download them in full
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUS,
+                      allowed_methods=["GET", "HEAD"], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.save()
+
+    def get(self, url):
+        """Download a webpage, or read it from the cache if the server answers that it did not change
+
+        Args:
+            url (str): The url of the webpage
+
+        Returns:
+            FetchedPage: The webpage once the retries are done
+        """
+        if self.cache is None:
+            response = self.session.get(url, timeout=self.timeout)
+            return FetchedPage(response.text, response.url, response.status_code, False)
+
+        response = self.session.get(url, timeout=self.timeout, headers=self.cache.headers(url))
+        if response.status_code == 304:
+            page = self.cache.get(url)
+            if page is not None:
+                return page
+            # the cached webpage is gone, ask for it in full
+            response = self.session.get(url, timeout=self.timeout)
+        if response.status_code == 200:
+            self.cache.put(url, response)
+        return FetchedPage(response.text, response.url, response.status_code, False)
+
+    def open(self, url):
+        """Download a file as a stream of bytes, without the cache, for files too large to be kept in memory such as sitemaps
+
+        Args:
+            url (str): The url of the file
+
+        Returns:
+            file: The body of the response, read as it arrives, to be closed once read
+
+        Raises:
+            requests.RequestException: If the file could not be downloaded
+        """
+        response = self.session.get(url, timeout=self.timeout, stream=True)
+        if response.status_code != 200:
+            response.close()
+            raise requests.HTTPError(str(response.status_code) + " " + str(response.reason) + " for " + url, response=response)
+        # the Content-Encoding of the server is undone, a .gz file stays compressed
+        response.raw.decode_content = True
+        # reading past the end returns b"" instead of failing once urllib3 has closed the connection
+        response.raw.auto_close = False
+        return response.raw
+
+    def map(self, function, items):
+        """Call function(self, item) for each item over a pool of threads, at most concurrency at the same time
+
+        Args:
+            function (function): Takes the fetcher and one item, such as a url
+            items (iterable): The items, read as the pool needs more work
+
+        Yields:
+            The results of function in the same order as the items
+        """
+        window = self.concurrency * 2
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = collections.deque()
+            for item in items:
+                pending.append(pool.submit(function, self, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,328 @@
+from collections import OrderedDict
+import json
+import os
+import pathlib
+import threading
+
+from src.Classes import schemaCompiler
+
+
+def sortby(x):
+    try:
+        if x.split(".")[0] == "0":
+            x = x[x.index(".")+1:x.index("-")]
+        else:
+            x = x[:x.index(".")] + x[x.index("."):x.index("-")]
+        return float(x)
+    except ValueError:
+        return float('inf')
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# property names must be lowerCamelCase when the metadata only uses schema.org vocabulary
+SCHEMA_ORG_PROPERTY_NAMES = {"pattern": "^[a-z@\$][a-zA-Z]*$"}
+
+
+class ValidatorCache:
+    """A process-wide LRU cache of the profile JSON schemas and their compiled Draft7Validator.
+
+    Entries are keyed by the resolved path of the profile and are reloaded when the
+    modification time of the file changes, so a batch run only pays for reading, parsing
+    and compiling a profile once per profile version.
+
+    A profile links to the released profiles it uses with a $ref to their file, the validators
+    resolve them through this cache so each referenced profile is only loaded once.
+
+    With compiledExt, the profiles are compiled into Python functions by schemaCompiler, and the
+    source is kept next to the profile with that file extension. A profile using a keyword the
+    compiler does not handle is validated by a Draft7Validator.
+    """
+
+    def __init__(self, loader, maxsize, compiledExt=None, profileLoc=None):
+        """
+        Args:
+            loader (function): Takes a path and returns the tuple (schema dict, path), such as validator.path_to_dict
+            maxsize (int): The number of profiles kept before the least recently used one is evicted
+            compiledExt (str): File extension of the compiled profiles, None to use jsonschema
+            profileLoc (str): The directory the $ref of the profiles are resolved from, config.PROFILE_LOC,
+                              so a profile copied elsewhere still links to the profiles there, see schemaCompiler.base_uri
+        """
+        self.loader = loader
+        self.maxsize = maxsize
+        self.compiledExt = compiledExt
+        self.profileLoc = profileLoc
+        self._entries = OrderedDict()
+        # reentrant as compiling a profile loads the profiles it refers to
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _entry(self, path):
+        path = pathlib.Path(path)
+        key = str(path.resolve())
+        mtime = path.stat().st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["mtime"] == mtime:
+                self._entries.move_to_end(key)
+                return entry
+
+        schema, path = self.loader(path)
+        entry = {"mtime": mtime, "path": path, "schema": schema, "validators": dict()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _referenced(self, uri):
+        # called by the RefResolver of the validators for the $ref to another profile file
+        return self._entry(schemaCompiler.uri_to_path(uri))["schema"]
+
+    def compile(self, schema, path):
+        """Compile a profile JSON schema, its $ref to other profiles are resolved from path and loaded through the cache
+
+        Args:
+            schema (dict): The profile JSON schema
+            path (str/Path): Path to the profile JSON schema
+
+        Returns:
+            Draft7Validator: The validator of the schema
+        """
+        # jsonschema is only imported for the profiles the compiler does not handle
+        from jsonschema import Draft7Validator
+        from jsonschema import RefResolver
+        resolver = RefResolver(schemaCompiler.base_uri(path, self.profileLoc), schema,
+                               handlers={"file": self._referenced})
+        return Draft7Validator(schema, resolver=resolver)
+
+    def schema(self, path):
+        """Return the profile JSON schema stored at path
+
+        Args:
+            path (str/Path): Path to the profile JSON schema
+
+        Returns:
+            tuple: The schema dict and the path of the profile, same as validator.path_to_dict
+        """
+        entry = self._entry(path)
+        return entry["schema"], entry["path"]
+
+    def validator(self, path, schemaOrgNames=False):
+        """Return the compiled validator of the profile JSON schema stored at path
+
+        Args:
+            path (str/Path): Path to the profile JSON schema
+            schemaOrgNames (bool): True if the property names have to follow the schema.org lowerCamelCase format
+
+        Returns:
+            tuple: The schema dict the validator was compiled from and the Draft7Validator
+        """
+        entry = self._entry(path)
+        with self._lock:
+            if schemaOrgNames not in entry["validators"]:
+                schema = entry["schema"]
+                # shallow copy so the cached schema itself is never changed
+                namesSchema = dict(schema)
+                namesSchema["propertyNames"] = SCHEMA_ORG_PROPERTY_NAMES
+                roots = [schema, namesSchema]
+                validators = None
+                if self.compiledExt:
+                    try:
+                        sourcePath = pathlib.Path(entry["path"]).with_suffix(self.compiledExt)
+                        validators = schemaCompiler.load(roots, entry["path"], self._referenced, sourcePath, self.profileLoc)
+                    except schemaCompiler.UnsupportedSchema:
+                        validators = None
+                if validators is None:
+                    validators = [self.compile(root, entry["path"]) for root in roots]
+                entry["validators"][False] = (schema, validators[0])
+                entry["validators"][True] = (namesSchema, validators[1])
+            return entry["validators"][schemaOrgNames]
+
+
+class ProfileMarginality:
+    """The marginality list of one profile version as frozensets, built once and shared by every validation."""
+    __slots__ = ("minimum", "recommended", "optional", "all", "default")
+
+    def __init__(self, profileListDict, defaultProperties):
+        """
+        Args:
+            profileListDict (dict): The marginality list, with the keys "minimum", "recommended" and "optional"
+            defaultProperties (iterable): Property names such as @type that are not in the profile but are not extra properties
+        """
+        self.minimum = frozenset(profileListDict["minimum"])
+        self.recommended = frozenset(profileListDict["recommended"])
+        self.optional = frozenset(profileListDict["optional"])
+        self.all = frozenset().union(*profileListDict.values())
+        self.default = frozenset(defaultProperties)
+
+    @classmethod
+    def from_file(cls, listPath, defaultPropPath):
+        with pathlib.Path(defaultPropPath).open() as f:
+            defaultProperties = f.read().splitlines()
+        return cls(json.loads(pathlib.Path(listPath).read_text()), defaultProperties)
+
+    def sets(self, existProperty, diffKeys):
+        """Sort the properties of the metadata by the marginality of the profile
+
+        Args:
+            existProperty (iterable): The property names in the metadata
+            diffKeys (iterable): The property names in the metadata that has error
+
+        Returns:
+            dict: For "minimum", "recommended" and "optional" the number of property in the profile
+                  and the sets of "missing", "implemented" and "error" property, "extra" is the set of property not in the profile
+        """
+        existProperty = set(existProperty)
+        marginality = dict()
+        for level in ("minimum", "recommended", "optional"):
+            profileProperty = getattr(self, level)
+            marginality[level] = {
+                "total": len(profileProperty),
+                "missing": profileProperty - existProperty,
+                "implemented": profileProperty & existProperty,
+                "error": profileProperty.intersection(diffKeys)}
+        marginality["extra"] = existProperty - self.all - self.default
+        return marginality
+
+
+class ProfileIndex:
+    """An in-memory index of the profile JSON schemas and marginality lists made by buildprofile.
+
+    Each location is listed once and kept as profile name -> versions sorted from the newest,
+    with the latest RELEASE and DRAFT version. A location, or one of its profile directories,
+    is only listed again when the modification time of that directory changes.
+    """
+
+    def __init__(self, profileLoc, profileExt, margLoc, margExt, defaultPropPath=None):
+        """
+        Args:
+            profileLoc (str): Location of the profile JSON schemas, config.PROFILE_LOC
+            profileExt (str): File extension of the profile JSON schemas, config.PROFILE_EXT
+            margLoc (str): Location of the marginality lists, config.PROFILE_MARG_LOC
+            margExt (str): File extension of the marginality lists, config.PROFILE_MARG_EXT
+            defaultPropPath (str): The list of property names that are never extra properties, config.METADATA_DEFAULT_PROP
+        """
+        self.defaultPropPath = defaultPropPath
+        self._defaultProperties = None
+        self._locations = {
+            "profile": (pathlib.Path(profileLoc), profileExt),
+            "marginality": (pathlib.Path(margLoc), margExt)}
+        self._rootMtimes = dict()
+        self._names = {kind: dict() for kind in self._locations}
+        self._lock = threading.Lock()
+
+    def _scan_versions(self, directory, ext, mtime):
+        files = dict()
+        for fileName in os.listdir(directory):
+            if fileName.endswith(ext):
+                files[fileName[:len(fileName)-len(ext)]] = fileName
+        # sort by name first so the latest dated file wins between equal version numbers
+        versions = sorted(files.keys(), reverse=True)
+        versions.sort(key=sortby, reverse=True)
+        releases = [v for v in versions if "RELEASE" in v]
+        drafts = [v for v in versions if "DRAFT" in v]
+        return {"mtime": mtime,
+                "marginality": dict(),
+                "files": files,
+                "versions": versions,
+                "release": releases[0] if releases else None,
+                "draft": drafts[0] if drafts else None}
+
+    def _entry(self, kind, name):
+        if type(name) is not str:
+            return None
+        root, ext = self._locations[kind]
+        with self._lock:
+            rootMtime = _mtime(root)
+            names = self._names[kind]
+            if rootMtime != self._rootMtimes.get(kind):
+                existing = set(os.listdir(root)) if rootMtime is not None else set()
+                for oldName in set(names) - existing:
+                    del names[oldName]
+                for newName in existing - set(names):
+                    names[newName] = None
+                self._rootMtimes[kind] = rootMtime
+            if name not in names:
+                return None
+
+            directory = root / name
+            dirMtime = _mtime(directory)
+            entry = names[name]
+            if entry is None or entry["mtime"] != dirMtime:
+                if dirMtime is None or not directory.is_dir():
+                    entry = None
+                else:
+                    entry = self._scan_versions(directory, ext, dirMtime)
+                names[name] = entry
+            return entry
+
+    def __contains__(self, name):
+        entry = self._entry("profile", name)
+        return entry is not None and len(entry["versions"]) != 0
+
+    def versions(self, name):
+        """Return the versions of a profile, newest first, as file names without extension"""
+        entry = self._entry("profile", name)
+        return list(entry["versions"]) if entry is not None else list()
+
+    def latest_release(self, name):
+        entry = self._entry("profile", name)
+        return entry["release"] if entry is not None else None
+
+    def latest_draft(self, name):
+        entry = self._entry("profile", name)
+        return entry["draft"] if entry is not None else None
+
+    def latest(self, name):
+        """Return the most recent RELEASE version of a profile, or its most recent version if it was never released"""
+        entry = self._entry("profile", name)
+        if entry is None or len(entry["versions"]) == 0:
+            return None
+        return entry["release"] if entry["release"] is not None else entry["versions"][0]
+
+    def _path(self, kind, name, version):
+        entry = self._entry(kind, name)
+        if entry is None or version not in entry["files"]:
+            return None
+        return self._locations[kind][0] / name / entry["files"][version]
+
+    def profile_path(self, name, version):
+        """Return the path to the JSON schema of this profile version, None if it was not built"""
+        return self._path("profile", name, version)
+
+    def marginality_path(self, name, version):
+        """Return the path to the marginality list of this profile version, None if it was not built"""
+        return self._path("marginality", name, version)
+
+    def marginality(self, name, version):
+        """Return the ProfileMarginality of this profile version, None if its marginality list was not built.
+        It is read once and kept until the directory of the profile changes, as buildprofile recreates the files.
+        """
+        entry = self._entry("marginality", name)
+        if entry is None or version not in entry["files"]:
+            return None
+        with self._lock:
+            if version not in entry["marginality"]:
+                if self._defaultProperties is None:
+                    defaultProperties = list()
+                    if self.defaultPropPath is not None:
+                        with pathlib.Path(self.defaultPropPath).open() as f:
+                            defaultProperties = f.read().splitlines()
+                    self._defaultProperties = frozenset(defaultProperties)
+                listPath = self._locations["marginality"][0] / name / entry["files"][version]
+                entry["marginality"][version] = ProfileMarginality(
+                    json.loads(listPath.read_text()), self._defaultProperties)
+            return entry["marginality"][version]
@@ -1,32 +1,51 @@
+import re
 import sys
 import click
+
+# the information kept from the yml of a property, each line with one of them starts a block
+INFO_NEEDED = re.compile("expected_types:|marginality:|cardinality:|controlled_vocab:")
+
+
 def separateSpecAndMapping(file):
-    try:
-        specInfo = file.split("spec_info:")[1].split("mapping:")[0]
-        mapping = file.split("spec_info:")[1].split("mapping:")[1].split("---")[0]
-        return specInfo, mapping    
-    except IndexError:
+    """Return the spec_info and the mapping of a profile yml file, None, None if one of them is missing.
+    The spec_info ends at the first "mapping:", the mapping ends at the next "mapping:", "spec_info:" or "---".
+    """
+    specStart = file.find("spec_info:")
+    if specStart == -1:
+        return None, None
+    specStart += len("spec_info:")
+    specEnd = file.find("spec_info:", specStart)
+    if specEnd == -1:
+        specEnd = len(file)
+    mappingStart = file.find("mapping:", specStart, specEnd)
+    if mappingStart == -1:
         return None, None
-        
+    specInfo = file[specStart:mappingStart]
+    mappingStart += len("mapping:")
+    mappingEnd = specEnd
+    for end in ("mapping:", "---"):
+        index = file.find(end, mappingStart, mappingEnd)
+        if index != -1:
+            mappingEnd = index
+    return specInfo, file[mappingStart:mappingEnd]
+
 
 def tranform_yml_to_dict(yml):
     # print("tranform_lines_to_dict")
     lines = yml.splitlines()
-    infoNeeded = ["expected_types:", "marginality:", "cardinality:", "controlled_vocab:"]
     blocks = list()
     infodict = dict()
     i = 0
-    while i in range(len(lines)):
-        lines[i] = lines[i].strip()
-        res = [ele for ele in infoNeeded if(ele in lines[i])]
-        if res:
-            if (i+1) in range(len(lines)):
-                while ":" in lines[i] and ":" not in lines[i+1]:
-                    lines[i] = lines[i] +  lines[i+1]
-                    lines.remove(lines[i+1])
-
-            blocks.append(lines[i])
+    # each line is read once, the lines without a colon after a block are the values of the block
+    while i < len(lines):
+        line = lines[i].strip()
         i = i + 1
+        if INFO_NEEDED.search(line):
+            block = [line]
+            while i < len(lines) and ":" not in lines[i]:
+                block.append(lines[i])
+                i = i + 1
+            blocks.append("".join(block))
     for line in blocks:
         key = line.split(":")[0].replace("[^a-zA-Z]", "")
         typess = line.split(":")[1].replace(" ", "").split("-")
@@ -42,6 +61,6 @@ def tranform_yml_to_dict(yml):
                 infodict[key].append(types)
             infodict[key].sort(reverse=True)
         else:
-            
+
             infodict[key] = typess[0]
     return infodict
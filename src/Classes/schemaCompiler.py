@@ -0,0 +1,461 @@
+import collections
+import hashlib
+import json
+import os
+import pathlib
+import re
+from numbers import Number
+from urllib.parse import urldefrag
+from urllib.parse import urljoin
+from urllib.parse import unquote
+from urllib.parse import urlparse
+
+
+# changing the generated code needs a new version, so the sources cached on disk are made again
+COMPILER_VERSION = 1
+
+# the draft 7 keywords that change the result of a validation, any other key is an annotation such as validityCheck
+DRAFT7_KEYWORDS = {"$ref", "additionalItems", "additionalProperties", "allOf", "anyOf", "const", "contains",
+                   "dependencies", "enum", "exclusiveMaximum", "exclusiveMinimum", "format", "if", "items",
+                   "maxItems", "maxLength", "maxProperties", "maximum", "minItems", "minLength", "minProperties",
+                   "minimum", "multipleOf", "oneOf", "not", "pattern", "patternProperties", "properties",
+                   "propertyNames", "required", "type", "uniqueItems"}
+
+# the keywords used by the profiles made by buildprofile, a schema with another draft 7 keyword is left to jsonschema
+SUPPORTED_KEYWORDS = {"$ref", "anyOf", "const", "enum", "format", "items", "maxItems", "not", "pattern",
+                      "properties", "propertyNames", "required", "type"}
+
+# same as the draft 7 type checker of jsonschema
+TYPE_CHECKS = {
+    "array": "isinstance({0}, list)",
+    "boolean": "isinstance({0}, bool)",
+    "integer": "((isinstance({0}, int) and not isinstance({0}, bool)) or (isinstance({0}, float) and {0}.is_integer()))",
+    "null": "{0} is None",
+    "number": "(isinstance({0}, Number) and not isinstance({0}, bool))",
+    "object": "isinstance({0}, dict)",
+    "string": "isinstance({0}, str)"}
+
+
+class UnsupportedSchema(Exception):
+    """The schema uses a keyword, or a form of a keyword, that the compiler does not handle"""
+
+
+_TRUE = object()
+_FALSE = object()
+
+
+def unbool(element):
+    """True and False are not equal to 1 and 0 in JSON schema, same as jsonschema._utils.unbool"""
+    if element is True:
+        return _TRUE
+    elif element is False:
+        return _FALSE
+    return element
+
+
+def equal(one, two):
+    return unbool(one) == unbool(two)
+
+
+def enum_ok(instance, enums, strings):
+    """Same as the enum keyword of jsonschema, strings is the set of the strings in enums for a quicker lookup"""
+    if type(instance) is str:
+        return instance in strings
+    if instance == 0 or instance == 1:
+        unbooled = unbool(instance)
+        return not all(unbooled != unbool(each) for each in enums)
+    return instance in enums
+
+
+class CompiledError:
+    """A validation error with the same attributes as the jsonschema ValidationError that validator.validation_report uses"""
+    __slots__ = ("message", "path", "schema_path", "schema")
+
+    def __init__(self, message, path, schemaPath, validityCheck):
+        self.message = message
+        self.path = collections.deque(path)
+        self.schema_path = collections.deque(schemaPath)
+        # only the validityCheck of the schema where the error was found is kept
+        self.schema = {"validityCheck": validityCheck} if validityCheck is not None else dict()
+
+
+class CompiledValidator:
+    """Validates an instance with the Python functions compiled from a JSON schema, used in place of a Draft7Validator"""
+
+    def __init__(self, valid, errors):
+        self._valid = valid
+        self._errors = errors
+
+    def is_valid(self, instance):
+        return self._valid(instance)
+
+    def iter_errors(self, instance):
+        if self._valid(instance):
+            return
+        for message, path, schemaPath, validityCheck in self._errors(instance):
+            yield CompiledError(message, path, schemaPath, validityCheck)
+
+
+class _Generator:
+    """Writes the Python source of the validation functions of one or more root schemas.
+
+    Each subschema has a function returning whether an instance is valid, and if it is on the way to an error,
+    a generator of the errors in the order jsonschema finds them. The $ref are resolved when compiling.
+    """
+
+    def __init__(self, roots, baseUri, handler):
+        self.roots = roots
+        self.baseUri = urldefrag(baseUri)[0]
+        # jsonschema is only imported when a profile has to be compiled again
+        from jsonschema import RefResolver
+        self.resolvers = [RefResolver(self.baseUri, root, handlers={"file": handler}) for root in roots]
+        # a $ref to the root file resolves to the root being validated, so the roots can not share functions
+        self.perRoot = False
+        self.selfReferenced = False
+        self.names = dict()
+        self.pending = list()
+        self.functions = list()
+        self.constants = list()
+        self._constantNames = dict()
+        # kept so the id of the subschemas are not reused while compiling
+        self._kept = list()
+
+    def constant(self, value, prefix="C"):
+        key = (prefix, repr(value))
+        if key not in self._constantNames:
+            name = prefix + "_" + str(len(self._constantNames))
+            self._constantNames[key] = name
+            self.constants.append(name + " = " + self.expression(value, prefix))
+        return self._constantNames[key]
+
+    @staticmethod
+    def expression(value, prefix):
+        if prefix == "P":
+            return "re.compile(" + repr(value) + ").search"
+        if prefix == "S":
+            return "frozenset(" + repr(value) + ")"
+        return repr(value)
+
+    def name(self, kind, schema, scope, root):
+        key = (kind, root if self.perRoot else 0, id(schema), scope)
+        if key not in self.names:
+            self.names[key] = kind + "_" + str(len(self.names))
+            self._kept.append(schema)
+            self.pending.append((kind, self.names[key], schema, scope, root))
+        return self.names[key]
+
+    def resolve(self, scope, ref, root):
+        url = urljoin(scope, ref)
+        if urldefrag(url)[0] == self.baseUri:
+            self.selfReferenced = True
+        return url, self.resolvers[root].resolve_from_url(url)
+
+    def generate(self):
+        rootNames = [(self.name("v", root, self.baseUri, index), self.name("e", root, self.baseUri, index))
+                     for index, root in enumerate(self.roots)]
+        while self.pending:
+            kind, name, schema, scope, root = self.pending.pop()
+            if kind == "v":
+                self.functions.append(self.valid_function(name, schema, scope, root))
+            else:
+                self.functions.append(self.error_function(name, schema, scope, root))
+        return rootNames
+
+    def keywords(self, schema, scope, root):
+        """Return the scope of the schema and its keywords in the order jsonschema checks them"""
+        if type(schema) is not dict:
+            raise UnsupportedSchema("schema of type " + type(schema).__name__)
+        schemaId = schema.get("$id", "")
+        if schemaId:
+            scope = urljoin(scope, schemaId)
+        if schema.get("$ref") is not None:
+            return scope, [("$ref", schema["$ref"])]
+        keywords = list()
+        for keyword, value in schema.items():
+            if keyword in SUPPORTED_KEYWORDS:
+                keywords.append((keyword, value))
+            elif keyword in DRAFT7_KEYWORDS:
+                raise UnsupportedSchema("keyword " + keyword)
+        return scope, keywords
+
+    def type_check(self, value):
+        types = [value] if type(value) is str else value
+        if type(types) is not list or any(t not in TYPE_CHECKS for t in types):
+            raise UnsupportedSchema("type " + repr(value))
+        if len(types) == 0:
+            return "False", ""
+        return " or ".join(TYPE_CHECKS[t].format("x") for t in types), ", ".join(repr(t) for t in types)
+
+    def valid_function(self, name, schema, scope, root):
+        lines = ["def " + name + "(x):"]
+        if schema is True or schema is False:
+            lines.append("    return " + str(schema))
+            return "\n".join(lines)
+        scope, keywords = self.keywords(schema, scope, root)
+        for keyword, value in keywords:
+            if keyword == "$ref":
+                url, resolved = self.resolve(scope, value, root)
+                lines.append("    return " + self.name("v", resolved, url, root) + "(x)")
+            elif keyword == "type":
+                check, _ = self.type_check(value)
+                lines.append("    if not (" + check + "):\n        return False")
+            elif keyword == "enum":
+                lines.append("    if not " + self.enum_check(value) + ":\n        return False")
+            elif keyword == "const":
+                lines.append("    if not " + self.const_check(value) + ":\n        return False")
+            elif keyword == "maxItems":
+                lines.append("    if isinstance(x, list) and len(x) > " + repr(value) + ":\n        return False")
+            elif keyword == "pattern":
+                lines.append("    if isinstance(x, str) and not " + self.constant(value, "P") + "(x):\n        return False")
+            elif keyword == "not":
+                lines.append("    if " + self.name("v", value, scope, root) + "(x):\n        return False")
+            elif keyword == "anyOf":
+                lines.append("    if not (" + self.any_of(value, scope, root) + "):\n        return False")
+            elif keyword == "items":
+                self.check_items(value)
+                lines.append("    if isinstance(x, list):\n        for item in x:\n"
+                             "            if not " + self.name("v", value, scope, root) + "(item):\n                return False")
+            elif keyword == "properties":
+                self.check_properties(value)
+                if len(value) != 0:
+                    lines.append("    if isinstance(x, dict):")
+                for propertyName, subschema in value.items():
+                    lines.append("        if " + repr(propertyName) + " in x and not "
+                                 + self.name("v", subschema, scope, root) + "(x[" + repr(propertyName) + "]):\n            return False")
+            elif keyword == "required":
+                lines.append("    if isinstance(x, dict) and not " + self.required_set(value) + " <= x.keys():\n        return False")
+            elif keyword == "propertyNames":
+                lines.append("    if isinstance(x, dict):\n        for key in x:\n"
+                             "            if not " + self.name("v", value, scope, root) + "(key):\n                return False")
+        if len(lines) == 1 or not lines[-1].startswith("    return"):
+            lines.append("    return True")
+        return "\n".join(lines)
+
+    def error_function(self, name, schema, scope, root):
+        lines = ["def " + name + "(x):"]
+        if schema is True:
+            lines.append("    return\n    yield")
+            return "\n".join(lines)
+        if schema is False:
+            lines.append("    yield (\"False schema does not allow %r\" % (x,), (), (), None)")
+            return "\n".join(lines)
+        validityCheck = repr(schema.get("validityCheck"))
+        scope, keywords = self.keywords(schema, scope, root)
+
+        def error(message, keyword):
+            return "yield (" + message + ", (), (" + repr(keyword) + ",), " + validityCheck + ")"
+
+        for keyword, value in keywords:
+            if keyword == "$ref":
+                url, resolved = self.resolve(scope, value, root)
+                lines.append("    yield from " + self.name("e", resolved, url, root) + "(x)")
+            elif keyword == "type":
+                check, types = self.type_check(value)
+                lines.append("    if not (" + check + "):\n        "
+                             + error("\"%r is not of type %s\" % (x, " + repr(types) + ")", keyword))
+            elif keyword == "enum":
+                lines.append("    if not " + self.enum_check(value) + ":\n        "
+                             + error("\"%r is not one of %r\" % (x, " + self.constant(value) + ")", keyword))
+            elif keyword == "const":
+                lines.append("    if not " + self.const_check(value) + ":\n        "
+                             + error("\"%r was expected\" % (" + self.constant(value) + ",)", keyword))
+            elif keyword == "maxItems":
+                lines.append("    if isinstance(x, list) and len(x) > " + repr(value) + ":\n        "
+                             + error("\"%r is too long\" % (x,)", keyword))
+            elif keyword == "pattern":
+                lines.append("    if isinstance(x, str) and not " + self.constant(value, "P") + "(x):\n        "
+                             + error("\"%r does not match %r\" % (x, " + repr(value) + ")", keyword))
+            elif keyword == "not":
+                lines.append("    if " + self.name("v", value, scope, root) + "(x):\n        "
+                             + error("\"%r is not allowed for %r\" % (" + self.constant(value) + ", x)", keyword))
+            elif keyword == "anyOf":
+                lines.append("    if not (" + self.any_of(value, scope, root) + "):\n        "
+                             + error("\"%r is not valid under any of the given schemas\" % (x,)", keyword))
+            elif keyword == "items":
+                self.check_items(value)
+                valid = self.name("v", value, scope, root)
+                errors = self.name("e", value, scope, root)
+                lines.append("    if isinstance(x, list):\n        for index, item in enumerate(x):\n"
+                             "            if not " + valid + "(item):\n"
+                             "                for m, p, s, c in " + errors + "(item):\n"
+                             "                    yield (m, (index,) + p, ('items',) + s, c)")
+            elif keyword == "properties":
+                self.check_properties(value)
+                if len(value) != 0:
+                    lines.append("    if isinstance(x, dict):")
+                for propertyName, subschema in value.items():
+                    valid = self.name("v", subschema, scope, root)
+                    errors = self.name("e", subschema, scope, root)
+                    item = "x[" + repr(propertyName) + "]"
+                    lines.append("        if " + repr(propertyName) + " in x and not " + valid + "(" + item + "):\n"
+                                 "            for m, p, s, c in " + errors + "(" + item + "):\n"
+                                 "                yield (m, (" + repr(propertyName) + ",) + p, ('properties', "
+                                 + repr(propertyName) + ") + s, c)")
+            elif keyword == "required":
+                self.required_set(value)
+                lines.append("    if isinstance(x, dict):\n        for key in " + self.constant(value) + ":\n"
+                             "            if key not in x:\n                "
+                             + error("\"%r is a required property\" % key", keyword))
+            elif keyword == "propertyNames":
+                valid = self.name("v", value, scope, root)
+                errors = self.name("e", value, scope, root)
+                lines.append("    if isinstance(x, dict):\n        for key in x:\n"
+                             "            if not " + valid + "(key):\n"
+                             "                for m, p, s, c in " + errors + "(key):\n"
+                             "                    yield (m, p, ('propertyNames',) + s, c)")
+        lines.append("    return\n    yield")
+        return "\n".join(lines)
+
+    def any_of(self, value, scope, root):
+        if type(value) is not list:
+            raise UnsupportedSchema("anyOf that is not a list")
+        if len(value) == 0:
+            return "False"
+        return " or ".join(self.name("v", subschema, scope, root) + "(x)" for subschema in value)
+
+    def enum_check(self, value):
+        if type(value) is not list:
+            raise UnsupportedSchema("enum that is not a list")
+        strings = [each for each in value if type(each) is str]
+        return "enum_ok(x, " + self.constant(value) + ", " + self.constant(strings, "S") + ")"
+
+    def const_check(self, value):
+        # a string is never equal to a boolean or a number, so == is the same as jsonschema there
+        if type(value) is str:
+            return "(x == " + self.constant(value) + ")"
+        return "equal(x, " + self.constant(value) + ")"
+
+    def required_set(self, value):
+        if type(value) is not list or any(type(each) is not str for each in value):
+            raise UnsupportedSchema("required that is not a list of strings")
+        return self.constant(value, "S")
+
+    @staticmethod
+    def check_items(value):
+        if type(value) is not dict and type(value) is not bool:
+            raise UnsupportedSchema("items that is not a schema")
+
+    @staticmethod
+    def check_properties(value):
+        if type(value) is not dict:
+            raise UnsupportedSchema("properties that is not an object")
+
+
+def base_uri(path, profileLoc=None):
+    """Return the uri the $ref of a profile are resolved from.
+
+    With profileLoc, it is the place of the profile in profileLoc whatever directory the profile was copied to,
+    so its $ref always link to the schema.org types and the released profiles in profileLoc.
+
+    Args:
+        path (str/Path): The file of the profile
+        profileLoc (str): The directory of the profiles, config.PROFILE_LOC, None to resolve from the file itself
+    """
+    path = pathlib.Path(path).resolve()
+    if profileLoc is None:
+        return path.as_uri()
+    return (pathlib.Path(profileLoc).resolve() / path.parent.name / path.name).as_uri()
+
+
+def compile_source(roots, path, handler, profileLoc=None):
+    """Compile root schemas into the Python source of their validation functions
+
+    Args:
+        roots (list): The root schemas, such as a profile and a copy of it with propertyNames
+        path (Path): The file the schemas were read from
+        handler (function): Takes the file uri of a referenced schema and returns the schema, see jsonschema.RefResolver
+        profileLoc (str): The directory the $ref are resolved from, see base_uri
+
+    Returns:
+        tuple: The source, and the uris of the files the source depends on
+    """
+    baseUri = base_uri(path, profileLoc)
+    uris = [pathlib.Path(path).resolve().as_uri()]
+
+    def recordingHandler(uri):
+        uris.append(urldefrag(uri)[0])
+        return handler(uri)
+
+    generator = _Generator(roots, baseUri, recordingHandler)
+    rootNames = generator.generate()
+    if generator.selfReferenced and len(roots) > 1:
+        # compiled again with functions per root, as "#" is not the same schema for each root
+        generator = _Generator(roots, baseUri, recordingHandler)
+        generator.perRoot = True
+        rootNames = generator.generate()
+
+    sources = dict()
+    for uri in uris:
+        sources[uri] = _digest(uri)
+    header = {"version": COMPILER_VERSION, "sources": sources}
+    source = ["# " + json.dumps(header),
+              "# generated by schemaCompiler from the JSON schema of the same name, enum_ok and equal are set by schemaCompiler.load",
+              "import re",
+              "from numbers import Number",
+              ""]
+    source.extend(generator.constants)
+    source.append("")
+    for function in generator.functions:
+        source.append(function)
+        source.append("")
+    source.append("ROOTS = [" + ", ".join("(" + valid + ", " + errors + ")" for valid, errors in rootNames) + "]")
+    return "\n".join(source) + "\n", list(sources.keys())
+
+
+def uri_to_path(uri):
+    """Return the path of a file uri, without importing urllib.request on POSIX where url2pathname is unquote"""
+    if os.name == "nt":
+        from urllib.request import url2pathname
+        return url2pathname(urlparse(uri).path)
+    return unquote(urlparse(uri).path)
+
+
+def _digest(uri):
+    try:
+        return hashlib.sha256(pathlib.Path(uri_to_path(uri)).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _up_to_date(sourcePath):
+    try:
+        with sourcePath.open() as f:
+            header = json.loads(f.readline()[2:])
+    except (OSError, ValueError):
+        return False
+    if type(header) is not dict or header.get("version") != COMPILER_VERSION:
+        return False
+    return all(_digest(uri) == digest for uri, digest in header.get("sources", dict()).items())
+
+
+def load(roots, path, handler, sourcePath, profileLoc=None):
+    """Return the CompiledValidator of each root schema, the compiled source is read from sourcePath
+    if it was made from the same schema files, otherwise it is compiled and written there
+
+    Args:
+        roots (list): The root schemas, such as a profile and a copy of it with propertyNames
+        path (Path): The file the schemas were read from
+        handler (function): Takes the file uri of a referenced schema and returns the schema
+        sourcePath (Path): The file of the compiled source, next to the schema
+        profileLoc (str): The directory the $ref are resolved from, see base_uri
+
+    Returns:
+        list: A CompiledValidator per root schema
+    """
+    sourcePath = pathlib.Path(sourcePath)
+    if _up_to_date(sourcePath):
+        source = sourcePath.read_text()
+    else:
+        source, _ = compile_source(roots, path, handler, profileLoc)
+        try:
+            # replaced in one step so another process never reads half of the file
+            temporaryPath = sourcePath.with_name(sourcePath.name + "." + str(os.getpid()) + ".tmp")
+            temporaryPath.write_text(source)
+            os.replace(temporaryPath, sourcePath)
+        except OSError:
+            # the directory of the schema is read only, the source is only used by this process
+            pass
+    # run without importing it, so no __pycache__ is written next to the profiles
+    namespace = {"enum_ok": enum_ok, "equal": equal}
+    exec(compile(source, str(sourcePath), "exec"), namespace)
+    return [CompiledValidator(valid, errors) for valid, errors in namespace["ROOTS"]]
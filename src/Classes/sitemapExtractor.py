@@ -1,43 +1,225 @@
-from xml.dom.minidom import parse
-import xml.dom.minidom
-import sys
+import concurrent.futures
+import gzip
+import io
 import pathlib
+import queue
+import sys
+import threading
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import urljoin
+from urllib.parse import urlparse
+
+import click
 import requests
-# ultimate_sitemap_parser
-from usp.tree import sitemap_tree_for_homepage
+
+sys.path.append("./")
+import src.Classes.config as config
+from src.Classes.httpFetcher import HttpFetcher
 
 
 # For a sitemap that has been downloaded
 # extract all the link inside and store in a file of the same name in the same directory as this program
 # xml_file =  sys.argv[1]
 
+# the first bytes of a gzip file
+GZIP_MAGIC = b"\x1f\x8b"
+# the number of entries read from the sitemaps and waiting to be used
+SITEMAP_QUEUE_SIZE = 10000
+
+
+def isRemote(source):
+    return urlparse(str(source)).scheme in ("http", "https")
+
+
+def localName(tag):
+    # the tags are read with their namespace, such as {http://www.sitemaps.org/schemas/sitemap/0.9}loc
+    return tag.rsplit("}", 1)[-1]
+
+
+def openSitemap(source, fetcher):
+    """Open a sitemap as a stream of bytes
+
+    Args:
+        source (str/Path): The path or the url of the sitemap
+        fetcher (HttpFetcher): Used to download the sitemap if source is a url
+
+    Returns:
+        BufferedReader: The sitemap, to be closed once read
+    """
+    if isRemote(source):
+        return io.BufferedReader(fetcher.open(str(source)))
+    return open(source, "rb")
+
+
+def decompressed(stream):
+    """Return the XML of a sitemap opened with openSitemap, decompressed if it is gzipped"""
+    # a sitemap can be gzipped whatever its name, or named .gz and decompressed by the server
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def childSource(loc, parent):
+    """Return where to read a sitemap listed in the sitemap index parent
+
+    A url is read from a copy with the same file name next to a local sitemap index, if there is one,
+    otherwise it is downloaded. A relative location is relative to the sitemap index.
+    """
+    if not isRemote(parent):
+        parentDir = pathlib.Path(parent).parent
+        if isRemote(loc):
+            localCopy = parentDir / pathlib.PurePosixPath(urlparse(loc).path).name
+            return localCopy if localCopy.is_file() else loc
+        return parentDir / loc
+    return urljoin(str(parent), loc)
+
+
+def sourceKey(source):
+    return str(source) if isRemote(source) else str(pathlib.Path(source).resolve())
+
+
+def readSitemap(sitemap, fetcher):
+    """Read the entries of one sitemap as it is parsed, with iterparse, dropping each entry once read
+    so the memory used does not grow with the size of the sitemap
+
+    Args:
+        sitemap (str/Path): The path or the url of the sitemap, can be gzipped
+        fetcher (HttpFetcher): Used to download the sitemap if it is a url
+
+    Yields:
+        tuple: "url" and the url of a webpage, or "sitemap" and the location of a sitemap listed in a sitemap index
+    """
+    try:
+        stream = openSitemap(sitemap, fetcher)
+    except (OSError, requests.RequestException) as error:
+        click.secho("Could not read the sitemap " + str(sitemap) + ": " + str(error), fg="red")
+        return
+    try:
+        with stream, decompressed(stream) as xmlStream:
+            root = None
+            for event, element in ElementTree.iterparse(xmlStream, events=("start", "end")):
+                if event == "start":
+                    if root is None:
+                        root = element
+                    continue
+                entry = localName(element.tag)
+                if entry not in ("url", "sitemap"):
+                    continue
+                loc = None
+                for child in element:
+                    if localName(child.tag) == "loc" and child.text is not None:
+                        loc = child.text.strip()
+                # the entries already read are not kept
+                element.clear()
+                root.clear()
+                if loc:
+                    yield entry, loc
+    except (ElementTree.ParseError, OSError, EOFError, requests.RequestException) as error:
+        click.secho("Could not read the rest of the sitemap " + str(sitemap) + ": " + str(error), fg="red")
+
+
+def sitemapUrls(sources, fetcher=None, workers=1):
+    """Read the urls of the webpages of sitemaps as they are parsed, and of the sitemaps they list.
+
+    The sitemaps are read by a pool of workers threads, each one once, so sitemap indexes listing each
+    other do not loop. The urls are given as soon as they are read, each one once, and those of the
+    different sitemaps are mixed when workers is more than 1. With 1 worker, the sitemaps listed in a
+    sitemap index are read after it, in order. The sitemaps that cannot be read are skipped with a message.
+
+    Args:
+        sources (str/Path/list): The path or the url of a sitemap or sitemap index, or a list of them
+        fetcher (HttpFetcher): Used to download the sitemaps, one is made from config.py if None and needed
+        workers (int): The number of sitemaps read at the same time
+
+    Yields:
+        str: The url of each webpage
+    """
+    if type(sources) is not list:
+        sources = [sources]
+    ownFetcher = None
+    if fetcher is None:
+        fetcher = ownFetcher = HttpFetcher(config.HTTP_CONCURRENCY, config.HTTP_TIMEOUT,
+                                           config.HTTP_RETRIES, config.HTTP_BACKOFF)
+    # the entries read by the threads, bounded so a slow consumer does not let them pile up in memory
+    entries = queue.Queue(maxsize=SITEMAP_QUEUE_SIZE)
+    stopped = threading.Event()
+
+    def read(sitemap):
+        try:
+            if stopped.is_set():
+                return
+            for entry, loc in readSitemap(sitemap, fetcher):
+                entries.put((entry, loc, sitemap))
+                if stopped.is_set():
+                    break
+        finally:
+            entries.put((None, None, sitemap))
+
+    seenSitemaps = set()
+    seenUrls = set()
+    running = 0
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        for source in sources:
+            if sourceKey(source) not in seenSitemaps:
+                seenSitemaps.add(sourceKey(source))
+                pool.submit(read, source)
+                running += 1
+        while running:
+            entry, loc, sitemap = entries.get()
+            if entry is None:
+                running -= 1
+            elif entry == "url":
+                if loc not in seenUrls:
+                    seenUrls.add(loc)
+                    yield loc
+            else:
+                child = childSource(loc, sitemap)
+                if sourceKey(child) in seenSitemaps:
+                    click.secho("The sitemap " + loc + " was already read, it is skipped.", fg="yellow")
+                    continue
+                seenSitemaps.add(sourceKey(child))
+                pool.submit(read, child)
+                running += 1
+    finally:
+        # if the urls are no longer needed, the threads are stopped at their next entry
+        stopped.set()
+        while running:
+            if entries.get()[0] is None:
+                running -= 1
+        pool.shutdown()
+        if ownFetcher is not None:
+            ownFetcher.close()
+
 
 def sitemapExtractor(xml_file):
-    if type(xml_file) is not pathlib.PosixPath:
-        xml_file_path = pathlib.Path(xml_file)
-    outputName = xml_file_path.parent.joinpath(xml_file_path.stem+ ".txt")
-    
-    if xml_file_path.exists():
-        DOMTree = xml.dom.minidom.parse(xml_file)
-        root_node = DOMTree.documentElement
-        loc_nodes = root_node.getElementsByTagName("loc")
+    """Write the urls of the webpages of a sitemap, and of the sitemaps it lists, to a text file as they are read
 
+    Args:
+        xml_file (str/Path): The path or the url of the sitemap or sitemap index, can be gzipped
+
+    Returns:
+        Path: The text file with one url per line, next to a local sitemap or named after the website of a url in the current directory
+    """
+    if isRemote(xml_file):
+        xml_file_path = pathlib.PurePosixPath(urlparse(str(xml_file)).path)
+        prefix, outputDir = urlparse(str(xml_file)).netloc + "_", pathlib.Path(".")
+    else:
+        xml_file_path = pathlib.Path(xml_file)
+        prefix, outputDir = "", xml_file_path.parent
+    name = xml_file_path.name
+    for suffix in (".gz", ".xml"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    outputName = outputDir.joinpath(prefix + name + ".txt")
 
     if outputName.exists():
         outputName.unlink()
-    f = outputName.open(mode = "x")
-
     print("Output location: " + str(outputName))
 
-    for loc in loc_nodes:
-        location = loc.childNodes[0].data
-        
-        if ".xml" in location:
-            print("There is a sitemap ", location, "in this sitemap, it will also need to be downloaded to be extracted.")
-        else:
+    with outputName.open(mode = "x") as f:
+        for location in sitemapUrls(xml_file):
             f.write(location + "\n")
-
-    f.close()
     return(outputName)
 
 # sitemapExtractor(xml_file)
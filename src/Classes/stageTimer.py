@@ -0,0 +1,136 @@
+import collections
+import contextlib
+import threading
+import time
+
+import click
+
+# the stages in the order they are displayed, the other stages come after them
+STAGE_ORDER = ["fetch", "extruct", "load", "resolve", "compile", "iter_errors", "date_semantic_check",
+               "check_completeness", "csv"]
+
+
+class _Stage:
+    """Times one stage inside a with block"""
+
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+class StageTimings:
+    """Collects how long each stage of a validation run takes, by profile.
+
+    The stages are timed with "with timings.stage(name):", which does nothing until enable() is called.
+    Inside "with timings.record():", the stages wait for the profile of the metadata, set with
+    timings.profile(name), before they are counted, so the loading of a metadata is counted under its profile.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._off = contextlib.nullcontext()
+        # (stage, profile name) -> list of seconds
+        self._samples = collections.defaultdict(list)
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def stage(self, name):
+        """Return a context manager timing the stage name, that does nothing if the timings are not enabled"""
+        if not self.enabled:
+            return self._off
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        """Count seconds for the stage name"""
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.append((name, seconds))
+            return
+        with self._lock:
+            self._samples[(name, "")].append(seconds)
+
+    def profile(self, name):
+        """Set the profile of the metadata of the current record"""
+        if self.enabled and getattr(self._local, "pending", None) is not None:
+            self._local.profile = name
+
+    @contextlib.contextmanager
+    def record(self):
+        """Count the stages inside the with block under the profile set during it, "" if none was set"""
+        if not self.enabled:
+            yield
+            return
+        self._local.pending = list()
+        self._local.profile = ""
+        try:
+            yield
+        finally:
+            pending, profile = self._local.pending, self._local.profile
+            self._local.pending = None
+            with self._lock:
+                for name, seconds in pending:
+                    self._samples[(name, profile)].append(seconds)
+
+    def drain(self):
+        """Return the samples collected so far and forget them, to send them from a worker process"""
+        with self._lock:
+            samples = dict(self._samples)
+            self._samples.clear()
+        return samples
+
+    def merge(self, samples):
+        """Add the samples returned by drain in another process"""
+        with self._lock:
+            for key, seconds in samples.items():
+                self._samples[key].extend(seconds)
+
+    def summary(self):
+        """Return the count, total and percentiles of each stage and profile
+
+        Returns:
+            list: dicts with the stage, the profile, the count, and the total, p50, p95 and p99 in seconds
+        """
+        with self._lock:
+            samples = {key: sorted(seconds) for key, seconds in self._samples.items()}
+        order = {name: n for n, name in enumerate(STAGE_ORDER)}
+        rows = list()
+        for (name, profile), seconds in sorted(samples.items(), key=lambda item: (order.get(item[0][0], len(order)), item[0])):
+            rows.append({"stage": name, "profile": profile, "count": len(seconds), "total": sum(seconds),
+                         "p50": percentile(seconds, 50), "p95": percentile(seconds, 95), "p99": percentile(seconds, 99)})
+        return rows
+
+    def report(self):
+        """Display the summary as a table, in milliseconds"""
+        rows = self.summary()
+        if len(rows) == 0:
+            click.echo("No stage was timed.")
+            return
+        click.secho("=======================Timings (ms):=================================")
+        header = "{:<20} {:<24} {:>7} {:>11} {:>9} {:>9} {:>9}"
+        click.echo(header.format("stage", "profile", "count", "total", "p50", "p95", "p99"))
+        for row in rows:
+            click.echo("{:<20} {:<24} {:>7} {:>11.2f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                row["stage"], row["profile"] or "-", row["count"], row["total"] * 1000,
+                row["p50"] * 1000, row["p95"] * 1000, row["p99"] * 1000))
+
+
+def percentile(sortedSamples, percent):
+    """Return the nearest-rank percentile of sorted samples"""
+    rank = max(1, -(-len(sortedSamples) * percent // 100))
+    return sortedSamples[int(rank) - 1]
+
+
+# the timings of the stages of this process, enabled by the --timings flag
+timings = StageTimings()
@@ -1,18 +1,35 @@
 import extruct
+import jstyleson
 import requests
 import pprint
 import json
+import locale
+import mmap
 import os
 from w3lib.html import get_base_url
 from urllib.parse import urlparse
 import time
 import sys
 sys.path.append("./")
-from bs4 import BeautifulSoup
 import re
 import pathlib 
 import rdflib
 import src.Classes.config as config
+from src.Classes.httpFetcher import HttpFetcher
+from src.Classes.httpFetcher import HttpCache
+from src.Classes.stageTimer import timings
+
+# the comments and the script elements of an HTML page, in the order they appear, the content of a script ends at the first </script>
+SCRIPT_OR_COMMENT = re.compile(r"<!--.*?-->|<script\b([^>]*)>(.*?)</script\s*>", re.IGNORECASE | re.DOTALL)
+SCRIPT_TYPE = re.compile(r"""(?:^|\s)type\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+SCRIPT_OR_COMMENT_BYTES = re.compile(SCRIPT_OR_COMMENT.pattern.encode(), re.IGNORECASE | re.DOTALL)
+SCRIPT_TYPE_BYTES = re.compile(SCRIPT_TYPE.pattern.encode(), re.IGNORECASE)
+# the same as extruct, the JSON-LD can start with HTML or JavaScript comments
+HTML_OR_JS_COMMENTLINE = re.compile(r"^\s*(//.*|<!--.*-->)")
+# a local file is HTML if it has a tag
+HTML_TAG = re.compile(rb"<[A-Za-z]")
+
+
 def progressPerc(total, current):
     sys.stdout.write("\r%d%%" % (current*100/total))
     sys.stdout.flush()
@@ -24,10 +41,145 @@ def urlValidation(url):
     return bool(re.match(regex, url))
 
 
+def loadPage(fetcher, link):
+    """Read the HTML of a link, downloaded if it is a url or read from the disk if it is a local HTML file
+
+    Args:
+        fetcher (HttpFetcher): The fetcher used to download the webpages
+        link (str): A url or a path
+
+    Returns:
+        dict: The "html", its "url", the "domain" and "outputName" used to save the JSON-LD, the "source" of the link
+              as "url", "local" or "other", whether it was "cached" and the "error" if the webpage could not be downloaded.
+              The "html" of a local file is its bytes, see readLocal, to be read with extractData and closed with closeHtml
+    """
+    page = {"html": "", "url": "", "domain": "", "outputName": None, "source": "other", "cached": False, "error": None}
+    #  if the link is a url
+    if urlValidation(link) is True:
+        page["source"] = "url"
+        page["domain"] = urlparse(link).netloc
+        page["outputName"] = link.split("/")[-1].strip() if len(link.split("/")[-1]) != 0 else link.split("/")[-2]
+        try:
+            r = fetcher.get(link)
+        except requests.RequestException as error:
+            page["error"] = error
+            return page
+        page["html"] = r.text
+        page["url"] = r.url
+        page["cached"] = r.cached
+
+    else:
+        # the file is read once, then checked for a tag and extracted from the same buffer
+        page["html"] = readLocal(link)
+        # if the link is a path to a local html file
+        if HTML_TAG.search(page["html"]):
+            page["source"] = "local"
+            page["domain"] = link.split("/")[-2] if len(link.split("/"))>=2 else link.split("/")[-1]
+            page["outputName"] = link.split("/")[-1].split(".")[0]
+    return page
+
+
+def readLocal(path):
+    """Read a local file as bytes, memory-mapped if it has at least config.LOCAL_HTML_MMAP_SIZE bytes
+
+    Returns:
+        bytes/mmap: The content of the file
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if config.LOCAL_HTML_MMAP_SIZE and size >= config.LOCAL_HTML_MMAP_SIZE:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+
+def htmlText(html):
+    """Return the HTML read by loadPage as str, decoded the same way as a file opened in text mode"""
+    if isinstance(html, str):
+        return html
+    text = bytes(html).decode(locale.getpreferredencoding(False))
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def closeHtml(html):
+    """Release the memory map of a large local file once its JSON-LD is extracted"""
+    if isinstance(html, mmap.mmap):
+        html.close()
+
+
+def scanJsonLd(html):
+    """Read the JSON-LD of the <script type="application/ld+json"> elements of an HTML page without parsing the rest of the page,
+    giving the same items as the JSON-LD of extruct
+
+    Args:
+        html (str/bytes/mmap): The HTML page, bytes are read as UTF-8 without being decoded first
+
+    Returns:
+        list: The JSON-LD items, None if one of them is not valid JSON so that extruct reports it
+    """
+    if isinstance(html, str):
+        scriptOrComment, scriptTypes, jsonLdType = SCRIPT_OR_COMMENT, SCRIPT_TYPE, "application/ld+json"
+    else:
+        scriptOrComment, scriptTypes, jsonLdType = SCRIPT_OR_COMMENT_BYTES, SCRIPT_TYPE_BYTES, b"application/ld+json"
+    items = list()
+    for match in scriptOrComment.finditer(html):
+        attributes, script = match.group(1, 2)
+        if attributes is None:
+            continue
+        scriptType = scriptTypes.search(attributes)
+        if scriptType is None or next(value for value in scriptType.groups() if value is not None) != jsonLdType:
+            continue
+        try:
+            data = json.loads(script, strict=False)
+        except ValueError:
+            try:
+                if not isinstance(script, str):
+                    script = script.decode("utf-8")
+                data = jstyleson.loads(HTML_OR_JS_COMMENTLINE.sub("", script), strict=False)
+            except ValueError:
+                return None
+        if isinstance(data, dict):
+            data = [data]
+        if isinstance(data, list):
+            items.extend(item for item in data if item)
+    return items
+
+
+def extractData(html, url):
+    """Extract the metadata of an HTML page, only the JSON-LD if there is some as the other syntaxes are then not used
+
+    Args:
+        html (str/bytes/mmap): The HTML page, as given by loadPage
+        url (str): The url of the page, used by extruct for the relative links of the other syntaxes
+
+    Returns:
+        dict: The items of each syntax, as extruct.extract, with only "json-ld" if the page has JSON-LD
+    """
+    items = scanJsonLd(html)
+    if items:
+        return {"json-ld": items}
+    html = htmlText(html)
+#         Return the base url if declared in the given HTML text, relative to the given base url.
+#         If no base url is found, the given baseurl is returned.
+    base_url = get_base_url(html, url)
+    return extruct.extract(html, base_url)
+
+
+def timedLoadPage(fetcher, link):
+    """loadPage timed as the fetch stage of --timings"""
+    with timings.stage("fetch"):
+        return loadPage(fetcher, link)
+
+
 def extract(oriPath):
     """This function 
     Args:
         oriPath (str/Path): A path that can be a url, a file path or a dir path
+
+    Returns:
+        str/list: The directory the JSON-LD was saved to if it was created, otherwise the list of the JSON-LD files saved,
+                  empty if nothing was extracted
     """
     print("Extracting static JSON-LD data from the link in/of", str(oriPath))
     # pp = pprint.PrettyPrinter(indent=2)
@@ -48,7 +200,7 @@ def extract(oriPath):
             # print(links)
         elif oriPath.is_dir():
             print("Extracting static JSON-LD data from the files in directory" + str(oriPath))
-            links = list(oriPath.iterdir())
+            links = [path for path in oriPath.iterdir() if path.is_file()]
         else:
             links.append(str(oriPath))
 
@@ -56,99 +208,90 @@ def extract(oriPath):
     resultPath = config.METADATA_LOC
     totalNumLinks = len(links)
     newPath = None
+    # kept over all the links, a link that fails does not lose the output of the links before it
+    resultList = list()
+    dirCreated = False
 
 
-    for n in range(totalNumLinks):
-        # print(links[n])
-        link = links[n].rstrip() if type(links[n]) is str else str(links[n]).rstrip()
-        # print(link)
-
-        html = ""
-        url  = ""
-        domain = ""
-        # print(urlValidation(link))
-        dirCreated = False
-        #  if the link is a url
-        if urlValidation(link) is True:
-            domain = urlparse(link).netloc
-            outputName = link.split("/")[-1].strip() if len(link.split("/")[-1]) != 0 else link.split("/")[-2]
-            r = requests.get(link)
-            html = r.text
-            url = r.url
-            
-            
-        # if the link is a path to a local html file
-        elif pathlib.Path(link).exists() and bool(BeautifulSoup(open(link, "r").read(), "html.parser").find()):     
-            domain = link.split("/")[-2] if len(link.split("/"))>=2 else link.split("/")[-1]
-            outputName = link.split("/")[-1].split(".")[0]
-            html = open(link, "r").read()
-#         Return the base url if declared in the given HTML text, relative to the given base url.
-#         If no base url is found, the given baseurl is returned.
-            print("Local HTML file")
-        
-        else:
-            print("\nThis path in \"" + str(oriPath) + "\" is neither url nor local html document, please double check.")
-            html = open(link, "r").read() 
-
-
-        base_url = get_base_url(html, url)
+    links = [link.rstrip() if type(link) is str else str(link).rstrip() for link in links]
+    cache = HttpCache(config.HTTP_CACHE_LOC, config.HTTP_CACHE_SIZE) if config.HTTP_CACHE_LOC else None
+    # closed even if a page fails, so the cache index is saved for the next runs
+    with HttpFetcher(config.HTTP_CONCURRENCY, config.HTTP_TIMEOUT, config.HTTP_RETRIES, config.HTTP_BACKOFF, cache) as fetcher:
+        # the webpages are downloaded concurrently, their JSON-LD is saved in the same order as the links
+        for n, page in enumerate(fetcher.map(timedLoadPage, links)):
+            link = links[n]
+            html = page["html"]
+            url = page["url"]
+            domain = page["domain"]
+            outputName = page["outputName"]
+            if page["error"] is not None:
+                print("\nCould not download " + link + ": " + str(page["error"]))
+                progressPerc(totalNumLinks, n)
+                continue
+            if page["cached"]:
+                print("Not modified since the last download, using the cached webpage")
+            if page["source"] == "local":
+                print("Local HTML file")
+            elif page["source"] == "other":
+                print("\nThis path in \"" + str(oriPath) + "\" is neither url nor local html document, please double check.")
 
 # list of syntaxes the library extruct, 'json-ld' is removed from the list as it is prioritied
-        syntaxesList = ['microdata',  'opengraph', 'microformat', 'rdfa', 'dublincore']
+            syntaxesList = ['microdata',  'opengraph', 'microformat', 'rdfa', 'dublincore']
         
-        data = extruct.extract(html, base_url)
-
-        resultList = list()
-        # priorities json-ld syntax
-        if len(data["json-ld"]) != 0:
-            for i in range(len(data["json-ld"])):
-                newPath = pathlib.Path(resultPath) / domain
-                if not os.path.exists(newPath):
-                    dirCreated = True
-                    os.makedirs(newPath)
-                outputFile = newPath / outputName 
-                outputFile = newPath.joinpath(
-                    outputName + "_" + str(i) + config.METADATA_EXT)
+            with timings.stage("extruct"):
+                data = extractData(html, url)
+            closeHtml(html)
+
+            # priorities json-ld syntax
+            if len(data["json-ld"]) != 0:
+                for i in range(len(data["json-ld"])):
+                    newPath = pathlib.Path(resultPath) / domain
+                    if not os.path.exists(newPath):
+                        dirCreated = True
+                        os.makedirs(newPath)
+                    outputFile = newPath / outputName 
+                    outputFile = newPath.joinpath(
+                        outputName + "_" + str(i) + config.METADATA_EXT)
 #                     print("outputFile",outputFile)
-                if os.path.exists(outputFile):
-                    os.remove(outputFile)
-                f = open(outputFile, "x")
+                    if os.path.exists(outputFile):
+                        os.remove(outputFile)
+                    f = open(outputFile, "x")
 #                     print("output name: ", outputFile)
-                dataJSONLD = data["json-ld"][i]
-                pretty_json = json.dumps(dataJSONLD , indent=2) 
-                f.write(pretty_json)
-                f.close()
-                resultList.append(outputFile)
-                # print(outputFile)
-                # print(newPath)
+                    dataJSONLD = data["json-ld"][i]
+                    pretty_json = json.dumps(dataJSONLD , indent=2) 
+                    f.write(pretty_json)
+                    f.close()
+                    resultList.append(outputFile)
+                    # print(outputFile)
+                    # print(newPath)
 
-        else:
-            for syntax in syntaxesList:
-                if len(data[syntax]) != 0:
-                    if syntax == "rdfa" or syntax == "microdata":
-                        #TODO convert rdfa and Microdata to jsonld as they are inclused in the rdflib
-                        g = rdflib.ConjunctiveGraph()
+            else:
+                for syntax in syntaxesList:
+                    if len(data[syntax]) != 0:
+                        if syntax == "rdfa" or syntax == "microdata":
+                            #TODO convert rdfa and Microdata to jsonld as they are inclused in the rdflib
+                            g = rdflib.ConjunctiveGraph()
 
-                        # # parse the metadata to a graph
-                        # if type(path) is not str:
-                        #     path = str(path)
-                        # result = g.parse(location=path, format=syntax)
+                            # # parse the metadata to a graph
+                            # if type(path) is not str:
+                            #     path = str(path)
+                            # result = g.parse(location=path, format=syntax)
 
-                        # # since this is for a bioschemas validator, which uses schema.org vocab
-                        # context = {"@vocab": "https://schema.org/"}
-                        # # serialize from the graph to json-ld
-                        # jsonData = g.serialize(format='json-ld', context=context, indent=4)
+                            # # since this is for a bioschemas validator, which uses schema.org vocab
+                            # context = {"@vocab": "https://schema.org/"}
+                            # # serialize from the graph to json-ld
+                            # jsonData = g.serialize(format='json-ld', context=context, indent=4)
 
-                        # pretty_json_dict = json.loads(jsonData.decode("utf-8"))
+                            # pretty_json_dict = json.loads(jsonData.decode("utf-8"))
 
                     
 
 
-            print("This is no JSON-LD data to extract in " + link)
-            pass
-        # print(newPath)
-        progressPerc(totalNumLinks, n)
-    progressPerc(totalNumLinks, n+1)
+                print("This is no JSON-LD data to extract in " + link)
+                pass
+            # print(newPath)
+            progressPerc(totalNumLinks, n)
+    progressPerc(totalNumLinks, totalNumLinks)
     print("Extraction done.") 
     # print(str(newPath))
     if dirCreated:
@@ -0,0 +1,170 @@
+import click
+
+MARGINALITY_LEVELS = [("minimum", "Minimum", "required"),
+                      ("recommended", "Recommended", "recommended"),
+                      ("optional", "Optional", "optional")]
+
+
+class ValidationReport:
+    """The result of validating one metadata against a Bioschemas profile.
+
+    It is made by validator.validation_report without displaying anything,
+    render_report displays it and marginality_result gives the dict saved in the csv files.
+    """
+    __slots__ = ("profileName", "profileVersion", "profilePath", "notices", "errors",
+                 "existProperties", "errorProperties", "semanticWarnings",
+                 "marginalityPath", "marginality")
+
+    def __init__(self):
+        self.profileName = ""
+        # file name of the profile JSON schema used, None if there was no profile to validate against
+        self.profileVersion = None
+        self.profilePath = None
+        # (message, colour) about how the profile was chosen
+        self.notices = list()
+        # (message, schema path, validityCheck) of each JSON schema error, sorted by the path in the metadata
+        self.errors = list()
+        self.existProperties = list()
+        self.errorProperties = set()
+        self.semanticWarnings = list()
+        self.marginalityPath = None
+        # see validator.marginality_sets, None if the profile has no marginality list
+        self.marginality = None
+
+    @property
+    def valid(self):
+        """True if the metadata has no error against the profile"""
+        return self.profilePath is not None and len(self.errors) == 0
+
+    def marginality_result(self, csv):
+        """The marginality of the metadata as returned by validator.validate
+
+        Args:
+            csv (string): "num", "name" or "all", whether the numbers, the property names or both are kept
+
+        Returns:
+            dict: The marginality result, 0 if the profile has no marginality list, None if no profile was used
+        """
+        if self.profilePath is None:
+            return None
+        if self.marginality is None:
+            return 0
+        return marginality_result(self.marginality, self.profileName, self.profileVersion, csv)
+
+
+def create_marg_dict(profileName, version):
+    result = dict()
+    result["Profile Name"] = profileName
+    result["Profile Version"] = version
+    result["Minimum"] = dict()
+    result["Recommended"] = dict()
+    result["Optional"] = dict()
+    return result
+
+
+def create_completeness_dir(format, result, key1, key2, properties):
+
+    number = str(len(properties)) if properties != "" else str(0)
+    names = sorted(list(properties)) if properties != "" else None
+    value = "None"
+    if format == "num":
+        value = number
+    elif format == "name":
+        value = names
+    elif format == "all":
+        value = (names if names is not None else list()) + ["Total: "+number]
+
+    result[key1][key2] = value
+
+    return result
+
+
+def marginality_result(marginality, profileName, version, csv):
+    result = create_marg_dict(profileName, version)
+    for level, key, _ in MARGINALITY_LEVELS:
+        sets = marginality[level]
+        if sets["total"] == 0:
+            create_completeness_dir(csv, result, key, "Missing", "")
+            create_completeness_dir(csv, result, key, "Implemented", "")
+            create_completeness_dir(csv, result, key, "Error", "")
+        else:
+            create_completeness_dir(csv, result, key, "Missing", sets["missing"])
+            create_completeness_dir(csv, result, key, "Implemented", sets["implemented"])
+            create_completeness_dir(csv, result, key, "Error", sets["error"])
+    minimum = marginality["minimum"]
+    result["Valid"] = "True" if len(minimum["missing"]) == 0 and len(minimum["error"]) == 0 else "False"
+    return result
+
+
+def render_error(message, schemaPath, validityCheck):
+    # if property does not exist
+    if "is a required property" in message:
+        click.secho(message + " but it's missing.")
+    # if property exist but has error(s)
+    else:
+        if "is not valid under any of the given schemas" in message:
+            click.secho("For property:" + str(schemaPath[1])+" , "+ str(message))
+        elif "does not match" in message:
+            click.secho("Property name: "+str(message))
+        else:
+            click.secho("message")
+            click.secho(message)
+        if validityCheck is not None:
+            click.secho(validityCheck)
+    click.secho("------")
+
+
+def render_marginality(marginality):
+    click.secho("============Properties Marginality Report:============")
+    for level, key, adjective in MARGINALITY_LEVELS:
+        sets = marginality[level]
+        click.secho("Marginality: " + key)
+        if sets["total"] == 0:
+            click.secho("    There are no " + level + " property " + ("required" if level == "minimum" else "recommended") + " by this profile.")
+            continue
+        title = adjective.capitalize()
+        if len(sets["missing"]) != 0:
+            click.secho("    " + title + " property that are missing: " + str(list(sets["missing"])))
+        else:
+            click.secho("    The data has all the " + adjective + " property(ies).")
+        if len(sets["error"]) != 0:
+            click.secho("    " + title + " property that has error: " + str(list(sets["error"])))
+        else:
+            click.secho("    Implemented " + adjective + " property has no error.")
+
+    # Extra properties not included in the Bioschemas profile
+    click.secho()
+    if len(marginality["extra"]) == 0:
+        click.secho("There is no property name in the metadata outside of the Bioschemas profile.")
+    else:
+        click.secho("These properties names are in the metadata but not in the Bioschemas profile:"+
+            str(list(marginality["extra"])))
+
+
+def render_report(report):
+    """Display a ValidationReport in the terminal
+
+    Args:
+        report (ValidationReport): The result of validator.validation_report
+    """
+    for message, colour in report.notices:
+        click.secho(message, fg=colour)
+    if report.profilePath is None:
+        return
+
+    click.secho("=======================Validator Message:=================================")
+    for message, schemaPath, validityCheck in report.errors:
+        render_error(message, schemaPath, validityCheck)
+    if len(report.errors) == 0:
+        click.secho("The data is valid against this profile")
+    else:
+        click.secho("Existing property value(s) that has error: " + str(list(report.errorProperties)))
+
+    for warning in report.semanticWarnings:
+        click.secho(warning)
+        click.secho("------")
+
+    click.secho(str(list(report.profilePath.parts)))
+    click.secho(str(report.marginalityPath))
+    if report.marginality is not None:
+        render_marginality(report.marginality)
@@ -0,0 +1,229 @@
+import http.server
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import time
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+import click
+
+import src.Classes.config as config
+from src.Classes.validator import load_metadata
+from src.Classes.validator import profileIndex
+from src.Classes.validator import validation_report
+from src.Classes.validator import validatorCache
+
+# content types of a request body with one metadata per line
+JSON_LINES_TYPES = ["application/x-ndjson", "application/jsonl", "application/json-lines"]
+
+
+def report_dict(report, csv, keyWarnings):
+    """Return a ValidationReport as a dict that can be sent as JSON
+
+    Args:
+        report (ValidationReport): The result of validator.validation_report
+        csv (string): "num", "name" or "all", see ValidationReport.marginality_result
+        keyWarnings (list): The KeyWarning found when loading the metadata
+    """
+    return {
+        "profileName": report.profileName,
+        "profileVersion": report.profileVersion,
+        "valid": report.valid,
+        "notices": [message for message, colour in report.notices],
+        "errors": [{"message": message, "schemaPath": list(schemaPath), "validityCheck": validityCheck}
+                   for message, schemaPath, validityCheck in report.errors],
+        "errorProperties": sorted(report.errorProperties),
+        "semanticWarnings": report.semanticWarnings,
+        "keyWarnings": [warning._asdict() for warning in keyWarnings],
+        "marginality": report.marginality_result(csv)}
+
+
+def validate_text(text, csv, profile):
+    """Validate one metadata in JSON the same way as the validate action, without displaying anything
+
+    Args:
+        text (str): The metadata
+        csv (string): "num", "name" or "all", see ValidationReport.marginality_result
+        profile (string): A path to the profile JSON schema to validate against, "N" to use the profile of the metadata
+
+    Returns:
+        dict: The report, see report_dict, or a dict with the error if the metadata can not be validated
+    """
+    try:
+        data, keyWarnings = load_metadata(text)
+    except json.JSONDecodeError as error:
+        return {"error": "The metadata is not valid JSON: " + str(error)}
+    if type(data) is not dict:
+        return {"error": "The metadata is not a JSON object."}
+    schema, schemaPath = None, ""
+    if profile != "N":
+        schema, schemaPath = validatorCache.schema(pathlib.Path(profile))
+    return report_dict(validation_report(data, schema, schemaPath), csv, keyWarnings)
+
+
+def query_profile_path(profile):
+    """Return the path of the profile a request asks for with its profile query parameter
+
+    Only the profiles in config.PROFILE_LOC can be asked for, by their name and version,
+    so a client can not make the server read, or write the compiled profile next to, any other file.
+
+    Args:
+        profile (string): The profile name and version, such as "Dataset/0.3-RELEASE-2019_06_14"
+
+    Returns:
+        Path: The path to the profile JSON schema, None if it is not a profile in config.PROFILE_LOC
+    """
+    name, _, version = profile.partition("/")
+    path = profileIndex.profile_path(name, version)
+    if path is None:
+        return None
+    # the names and versions come from the directory listing, this only guards against a link out of it
+    if pathlib.Path(config.PROFILE_LOC).resolve() not in path.resolve().parents:
+        return None
+    return path
+
+
+def warm_profiles():
+    """Load, compile and keep every profile JSON schema and marginality list in config.PROFILE_LOC
+
+    Returns:
+        int: The number of profile versions loaded
+    """
+    paths = list()
+    for name in sorted(os.listdir(config.PROFILE_LOC)):
+        for version in profileIndex.versions(name):
+            paths.append((name, version, profileIndex.profile_path(name, version)))
+    # none of them is evicted while the server runs
+    validatorCache.maxsize = max(validatorCache.maxsize, len(paths))
+    for name, version, path in paths:
+        validatorCache.validator(path, False)
+        validatorCache.validator(path, True)
+        profileIndex.marginality(name, version)
+    return len(paths)
+
+
+class ValidationHandler(http.server.BaseHTTPRequestHandler):
+    """Answers POST /validate with the validation of the metadata in the body, and GET /health.
+
+    The body is one metadata in JSON, or one metadata per line with a JSON Lines content type.
+    The query can set csv to "num", "name" or "all" for the marginality result, and profile to the
+    name and version of a profile in config.PROFILE_LOC, such as Dataset/0.3-RELEASE-2019_06_14,
+    to validate against instead of the profile of the metadata.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # the headers and the body are written separately, without TCP_NODELAY the client waits for a delayed ACK
+        self.disable_nagle_algorithm = self.server.address_family != socket.AF_UNIX
+        super().setup()
+
+    def address_string(self):
+        # the client of a Unix socket has no address
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self.send_json(404, {"error": "Unknown path, use POST /validate or GET /health"})
+            return
+        self.send_json(200, {"status": "ok", "profiles": len(validatorCache)})
+
+    def do_POST(self):
+        # the body is read before the request is checked, so the connection can be kept for the next request
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        url = urlparse(self.path)
+        if url.path != "/validate":
+            self.send_json(404, {"error": "Unknown path, use POST /validate or GET /health"})
+            return
+        query = parse_qs(url.query)
+        csv = query.get("csv", ["all"])[0]
+        profile = query.get("profile", ["N"])[0]
+        if csv not in ["num", "name", "all"]:
+            self.send_json(400, {"error": "csv needs to be num, name or all"})
+            return
+        if profile != "N":
+            profilePath = query_profile_path(profile)
+            if profilePath is None:
+                self.send_json(400, {"error": "The profile needs to be the name and version of a built profile, such as Dataset/0.3-RELEASE-2019_06_14"})
+                return
+            profile = str(profilePath)
+
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            self.send_json(400, {"error": "The body needs to be UTF-8 JSON"})
+            return
+        contentType = self.headers.get("Content-Type", "").split(";")[0].strip()
+        try:
+            if contentType in JSON_LINES_TYPES:
+                results = [validate_text(line, csv, profile) for line in text.splitlines() if line.strip() != ""]
+                self.send_json(200, results)
+                return
+            result = validate_text(text, csv, profile)
+        except Exception as error:
+            self.send_json(500, {"error": "The validation failed: " + repr(error)})
+            return
+        self.send_json(400 if "error" in result else 200, result)
+
+
+class ValidationServer(http.server.ThreadingHTTPServer):
+    """The validation server listening on a TCP port"""
+
+    daemon_threads = True
+
+    def __init__(self, address, quiet=False):
+        self.quiet = quiet
+        super().__init__(address, ValidationHandler)
+
+
+class UnixValidationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """The validation server listening on a Unix socket"""
+
+    daemon_threads = True
+
+    def __init__(self, socketPath, quiet=False):
+        self.quiet = quiet
+        super().__init__(socketPath, ValidationHandler)
+
+
+def serve(port, socketPath="", quiet=False):
+    """Load the profiles once, then validate the metadata sent over HTTP until stopped
+
+    Args:
+        port (int): The port listened to on localhost
+        socketPath (str): The path of a Unix socket to listen to instead of the port, "" to use the port
+        quiet (boolean): True to not display each request
+    """
+    start = time.perf_counter()
+    loaded = warm_profiles()
+    click.secho("Loaded " + str(loaded) + " profile versions in " + str(round(time.perf_counter() - start, 2)) + "s", fg="green")
+    if socketPath != "":
+        pathlib.Path(socketPath).unlink(missing_ok=True)
+        server = UnixValidationServer(socketPath, quiet)
+        click.echo("Validating on the Unix socket " + socketPath)
+    else:
+        server = ValidationServer((config.SERVE_HOST, port), quiet)
+        click.echo("Validating on http://" + config.SERVE_HOST + ":" + str(server.server_address[1]) + "/validate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.secho("Server stopped", fg="red")
+    finally:
+        server.server_close()
+        if socketPath != "":
+            pathlib.Path(socketPath).unlink(missing_ok=True)
@@ -1,156 +1,170 @@
+import collections
 import json
-from jsonschema import Draft7Validator
 import datetime
-import os
+import functools
 import re
 from dateutil.parser import parse
 import pathlib
 import sys
 sys.path.append("./")
 import src.Classes.config as config
+from src.Classes.profileCache import ValidatorCache, ProfileIndex, ProfileMarginality, SCHEMA_ORG_PROPERTY_NAMES, sortby
+from src.Classes.validationReport import ValidationReport, render_report, render_marginality
+from src.Classes.validationReport import marginality_result, create_marg_dict, create_completeness_dir
+from src.Classes.stageTimer import timings
 import click
 
 semanticPairDatePath = pathlib.Path("./src/Classes/semanticPairDate.txt")
 # validate a data using a schema
 def validate(data, csv, schema = None, profilePath = ""):
-    global errorPaths
-    global existProperty
-    global diffKeys
-    existProperty = list(data.keys())
-    errorPaths = list()
-    correctData = data
+    """Validate the metadata against a Bioschemas profile and display the report
+
+    Args:
+        data (dict): The metadata
+        csv (string): "num", "name" or "all", whether the marginality result keeps the numbers, the property names or both
+        schema (dict): The profile JSON schema, found from the metadata if None
+        profilePath (Path): The path to the profile JSON schema
+
+    Returns:
+        dict: The marginality result, 0 if the profile has no marginality list, None if no profile was used
+    """
+    report = validation_report(data, schema, profilePath)
+    render_report(report)
+    return report.marginality_result(csv)
+
+def validation_report(data, schema = None, profilePath = ""):
+    """Validate the metadata against a Bioschemas profile without displaying anything or changing data
+
+    Args:
+        data (dict): The metadata
+        schema (dict): The profile JSON schema, found from the metadata if None
+        profilePath (Path): The path to the profile JSON schema
+
+    Returns:
+        ValidationReport: The result of the validation
+    """
+    report = ValidationReport()
+    report.existProperties = list(data.keys())
     profileName = ""
     if schema is None:
-        # if "@type" in data.keys():
-        predicate = ""
-        path = pathlib.Path(config.PROFILE_LOC)
-        existProfile = os.listdir(path)
-        if "@context" in data.keys():
-            if type(data["@context"]) is list:
-                for item in data["@context"]:
-                    if type(item) is dict:
-                        for key, value in item.items():
-                            if "http://bioschemas.org/" in value or "https://bioschemas.org/" in value:
-#                                     click.secho(key, value)
-                                predicate = key + ":"
-        # find the profile the data conforms to
-        if "http://purl.org/dc/terms/conformsTo" in data.keys():
-            profileName, version = profileVersionConform(data["http://purl.org/dc/terms/conformsTo"])
-            # if the property value has a profile version
-            if version != -1:
-                profilePath = pathlib.Path(config.PROFILE_LOC) / profileName / (version + config.PROFILE_EXT)
-#                     if the path the data conform does not exist, erase the profilePath value
-                if profilePath.exists() is False:
-                    click.secho("The profile the data claims to conform to, " + str(profilePath) +", is does not exist. Therefore the most recently release or draft version of the same type will be used to validate the data instead.", fg="yellow")
-                    profilePath = ""
+        with timings.stage("resolve"):
+            # if "@type" in data.keys():
+            predicate = ""
+            if "@context" in data.keys():
+                if type(data["@context"]) is list:
+                    for item in data["@context"]:
+                        if type(item) is dict:
+                            for key, value in item.items():
+                                if "http://bioschemas.org/" in value or "https://bioschemas.org/" in value:
+                                    predicate = key + ":"
+            # find the profile the data conforms to
+            if "http://purl.org/dc/terms/conformsTo" in data.keys():
+                profileName, version = profileVersionConform(data["http://purl.org/dc/terms/conformsTo"])
+                # if the property value has a profile version
+                if version != -1:
+                    profilePath = profileIndex.profile_path(profileName, version)
+    #                     if the path the data conform does not exist, erase the profilePath value
+                    if profilePath is None:
+                        report.notices.append(("The profile the data claims to conform to, " + str(pathlib.Path(config.PROFILE_LOC) / profileName / (version + config.PROFILE_EXT)) +", is does not exist. Therefore the most recently release or draft version of the same type will be used to validate the data instead.", "yellow"))
+                        profilePath = ""
 
         
-        # if there is no conformTo, see the metadata type
-        elif "@type" in data.keys():
-            # print(type(data["@type"] ))
-            if type(data["@type"]) is str:
-                profileName = data["@type"] 
+            # if there is no conformTo, see the metadata type
+            elif "@type" in data.keys():
+                if type(data["@type"]) is str:
+                    profileName = data["@type"] 
             
-            elif type(data["@type"]) is list:
-                # print("type")
-
-                for t in data["@type"]:
-                    # print(t)
-                    if t in existProfile:
-                        profileName = t
-                # if none of the type in the array is a Bioschemas profile
-                if profileName == "":                        
-                    click.secho("This metadata is of type: "+str(data["@type"])+", none is an existing Bioschemas profile type.")
-                    return
+                elif type(data["@type"]) is list:
+                    for t in data["@type"]:
+                        if t in profileIndex:
+                            profileName = t
+                    # if none of the type in the array is a Bioschemas profile
+                    if profileName == "":                        
+                        report.notices.append(("This metadata is of type: "+str(data["@type"])+", none is an existing Bioschemas profile type.", None))
+                        return report
             
-        data = bioschemasPredicateRemoval(data, predicate)
-#           if the data did not have a profile link it conform to, only the type
-        if profilePath == "":
+            data = bioschemasPredicateRemoval(data, predicate)
+    #           if the data did not have a profile link it conform to, only the type
+            if profilePath == "":
             
-            if profileName in existProfile:
-                pathWithProfileName = path / profileName
-                if pathWithProfileName.is_dir():
-                    listv = os.listdir(pathWithProfileName)
-                    listv.sort(key=sortby, reverse=True)
-                    releaseList = [item for item in listv if "RELEASE" in item]
-                    if releaseList != []:
-                        version = releaseList[0]
-                    else:
-                        version = listv[0]
-
-                profilePath = pathlib.Path(config.PROFILE_LOC,  profileName ,version)
+                if profileName in profileIndex:
+                    profilePath = profileIndex.profile_path(profileName, profileIndex.latest(profileName))
+                    version = profilePath.name
 
                 
-        if profilePath != "":
-            schema,  profilePath= path_to_dict(profilePath)
-            click.secho("Validating against profile "+ str(profileName)+ " " + str(version))
-        elif profilePath == "":
-            click.secho("The profile schemas, \"" + str(profileName) + "\", does not yet exist in the profile JSON schema directory, please add it first by running buildprofile with the source data for \"" + str(profileName) + "\".")
-
-    if schema is not None:
-        version = profilePath.name
+            if profilePath != "":
+                schema,  profilePath= validatorCache.schema(profilePath)
+                report.notices.append(("Validating against profile "+ str(profileName)+ " " + str(version), None))
+            elif profilePath == "":
+                report.notices.append(("The profile schemas, \"" + str(profileName) + "\", does not yet exist in the profile JSON schema directory, please add it first by running buildprofile with the source data for \"" + str(profileName) + "\".", None))
+
+    if schema is None:
+        return report
+
+    report.profileName = profileName
+    report.profileVersion = profilePath.name
+    report.profilePath = profilePath
+    timings.profile(profilePath.parent.name)
 #             if the data uses only schemas.org properties, all property names should be lowerCamelCase
-        if "@context" in data.keys() and type(data["@context"]) != list and "http://schema.org" in data["@context"]:
-            schema["propertyNames"] = {"pattern": "^[a-z@\$][a-zA-Z]*$"}
-        v = Draft7Validator(schema)
-        errors = v.iter_errors(data)
-        click.secho("=======================Validator Message:=================================")
-        for e in sorted(errors, key=lambda e: e.path):
-#                 diffKeys = set(list(existProperty)) - set(list(data.keys()))
-#                 click.secho(e.schema_path)
-            # if property does not exist
-            if "is a required property" in e.message:
-                click.secho(e.message + " but it's missing.")
-            # if property exist but has error(s)
+    schemaOrgNames = "@context" in data.keys() and type(data["@context"]) != list and "http://schema.org" in data["@context"]
+    try:
+        with timings.stage("compile"):
+            if validatorCache.schema(profilePath)[0] is schema:
+                schema, v = validatorCache.validator(profilePath, schemaOrgNames)
             else:
-                if e.schema_path[0] == "properties":
-                    del correctData[e.schema_path[1]]
-                if "is not valid under any of the given schemas" in e.message:
-                    click.secho("For property:" + str(e.schema_path[1])+" , "+ str(e.message))
-                elif "does not match" in e.message:
-                    click.secho("Property name: "+str(e.message))
-
-                else:
-                    click.secho("message")
-                    click.secho(e.message)
-                if "validityCheck" in e.schema.keys() :
-                    click.secho(e.schema["validityCheck"])
-            click.secho("------")
-            errorPaths.append(e.schema_path[len(e.schema_path)-1])
-
-        diffKeys = set(list(existProperty)) - set(list(data.keys()))
-        if len(errorPaths)==0:
-            click.secho("The data is valid against this profile")
-        elif len(errorPaths)>0:
-            diffKeys = set(list(existProperty)) - set(list(data.keys()))
-            click.secho("Existing property value(s) that has error: " + str(list(diffKeys)))
-
-
-        date_semantic_check(correctData)
-
-        profilePathParts = list(profilePath.parts)
-        click.secho(str(profilePathParts))
-        listPath = pathlib.Path(config.PROFILE_MARG_LOC) / profilePathParts[-2] / profilePathParts[-1]
-        listPath = listPath.with_suffix(config.PROFILE_MARG_EXT)
-        click.secho(str(listPath))
-        if listPath.exists() is True:
-            result = check_completeness(
-                existProperty, diffKeys, listPath, profileName, version, csv)
-            return result
-        return 0
-#             click.secho("==========================================================================")
+                # a schema that was not loaded through the cache is compiled on its own
+                if schemaOrgNames:
+                    schema = dict(schema)
+                    schema["propertyNames"] = SCHEMA_ORG_PROPERTY_NAMES
+                v = validatorCache.compile(schema, profilePath)
+
+        with timings.stage("iter_errors"):
+            errors = sorted(v.iter_errors(data), key=lambda e: e.path)
+    except Exception as error:
+        # jsonschema is only imported once a profile is validated against
+        from jsonschema.exceptions import RefResolutionError
+        if not isinstance(error, RefResolutionError):
+            raise
+        report.errors.append(("The profile " + str(profilePath) + " refers to a schema that could not be loaded from "
+                              + str(config.PROFILE_LOC) + ": " + str(error), ("$ref",), None))
+        return report
+
+    # property that exist but has error(s) are left out of the semantic check
+    errorProperties = set()
+    for e in errors:
+        validityCheck = e.schema.get("validityCheck") if type(e.schema) is dict else None
+        report.errors.append((e.message, tuple(e.schema_path), validityCheck))
+        if "is a required property" not in e.message and e.schema_path[0] == "properties":
+            errorProperties.add(e.schema_path[1])
+    report.errorProperties = set(report.existProperties).intersection(errorProperties)
+
+    correctData = {key: value for key, value in data.items() if key not in errorProperties}
+    with timings.stage("date_semantic_check"):
+        report.semanticWarnings = date_semantic_check(correctData)
+
+    profilePathParts = list(profilePath.parts)
+    listPath = pathlib.Path(config.PROFILE_MARG_LOC) / profilePathParts[-2] / profilePathParts[-1]
+    listPath = listPath.with_suffix(config.PROFILE_MARG_EXT)
+    report.marginalityPath = listPath
+    with timings.stage("check_completeness"):
+        profileMarginality = profileIndex.marginality(profilePathParts[-2], listPath.stem)
+        if profileMarginality is not None:
+            report.marginality = profileMarginality.sets(report.existProperties, report.errorProperties)
+    return report
 
 def bioschemasPredicateRemoval(data, predicate):
-
+    """Return a copy of data where the Bioschemas predicate is removed from the values, data is not changed"""
     if type(data) is dict and "@type" in data.keys():
+        newData = dict()
         for key, value in data.items():
             if type(value) is str and predicate in value:
-                data[key] = value.replace(predicate, "")
-            if type(value) is dict:
-                bioschemasPredicateRemoval(value, predicate)
-            if type(value) is list:
-                for instance in value:
-                    bioschemasPredicateRemoval(instance, predicate)
+                value = value.replace(predicate, "")
+            elif type(value) is dict:
+                value = bioschemasPredicateRemoval(value, predicate)
+            elif type(value) is list:
+                value = [bioschemasPredicateRemoval(instance, predicate) for instance in value]
+            newData[key] = value
+        return newData
     return data
 
 def profileVersionConform(value):
@@ -189,165 +203,14 @@ def profileVersionConform(value):
         return "", -1
 
 
-def create_marg_dict(profileName, version):
-    result = dict()
-    result["Profile Name"] = profileName
-    result["Profile Version"] = version
-    result["Minimum"] = dict()
-    result["Recommended"] = dict()
-    result["Optional"] = dict()
-    return result
-
-def create_completeness_dir(format, result, key1, key2, properties):
-
-    number = str(len(properties)) if properties != "" else str(0)
-    names = sorted(list(properties)) if properties != "" else None
-    value = "None"
-    if format == "num":
-        value = number
-    elif format == "name":
-        value = names
-    elif format == "all":
-        names.append("Total: "+number)
-        value = names
-        
-    result[key1][key2] = value
-
-    return result
+def marginality_sets(existProperty, diffKeys, listPath):
+    """Sort the properties of the metadata by the marginality list at listPath, see ProfileMarginality.sets"""
+    return ProfileMarginality.from_file(listPath, config.METADATA_DEFAULT_PROP).sets(existProperty, diffKeys)
 
 def check_completeness(existProperty, diffKeys, listPath, profileName, version, csv):
-
-
-    result = create_marg_dict(profileName, version)
-
-
-    profileListDict = json.loads(listPath.read_text())
-    # property name such as @type that are not in the Bioschemas profile but should be in the json ld therefore will not be count as extra properties
-    with pathlib.Path(config.METADATA_DEFAULT_PROP).open() as f:
-        metadataDefaultProp = f.read().splitlines()
-
-    noMinimum  = len(profileListDict["minimum"])
-    noRecommended = len(profileListDict["recommended"])
-    noOptional = len(profileListDict["optional"])
-
-    existMinimum = set(profileListDict["minimum"]).intersection(existProperty)
-    existRecommended = set(profileListDict["recommended"]).intersection(existProperty)
-    existOptional = set(
-        profileListDict["optional"]).intersection(existProperty)
-
-    errorMinimum = set(profileListDict["minimum"]).intersection(diffKeys)
-    errorRecommended = set(profileListDict["recommended"]).intersection(diffKeys)
-    errorOptional = set(profileListDict["optional"]).intersection(diffKeys)
-
-    diffMinimum = set(profileListDict["minimum"]) - set(existProperty)
-    diffRecommended = set(profileListDict["recommended"]) - set(existProperty)
-    diffOptional = set(profileListDict["optional"]) - set(existProperty)
-
-    profileListDictValues = list(profileListDict.values())
-    profileListDictValue = list()
-    for v in profileListDictValues:
-        profileListDictValue += v
-
-    extraProp = (set(existProperty).difference(
-        set(profileListDictValue))).difference(set(metadataDefaultProp))
-
-    click.secho("============Properties Marginality Report:============")
-    # Minimum
-    click.secho("Marginality: Minimum")
-    if noMinimum == 0:
-        click.secho("    There are no minimum property required by this profile.")
-        create_completeness_dir(csv, result, "Minimum", "Missing", "")
-        create_completeness_dir(csv, result, "Minimum", "Implemented", "")
-        create_completeness_dir(csv, result, "Minimum", "Error", "")
-    else:
-        if len(list(diffMinimum)) != 0:
-            click.secho("    Required property that are missing: " + str(list(diffMinimum)))
-        else:
-            click.secho("    The data has all the required property(ies).")
-
-        if len(errorMinimum) != 0:
-            click.secho("    Required property that has error: " +
-                        str(list(errorMinimum)))
-        else:
-            click.secho("    Implemented required property has no error.")
-
-
-        create_completeness_dir(csv, result, "Minimum", "Missing", diffMinimum)
-        create_completeness_dir(csv, result, "Minimum",
-                                "Implemented", existMinimum)
-        create_completeness_dir(csv, result, "Minimum", "Error", errorMinimum)
-
-    result["Valid"] = "True" if len(diffMinimum) == 0 and len(
-        errorMinimum) == 0 else "False"
-    # Recommended
-    click.secho("Marginality: Recommended")
-    if noRecommended == 0:
-        click.secho("    There are no recommended property recommended by this profile.")
-
-        create_completeness_dir(csv, result, "Recommended", "Missing", "")
-        create_completeness_dir(csv, result, "Recommended", "Implemented", "")
-        create_completeness_dir(csv, result, "Recommended", "Error", "")
-    else:
-        if len(list(diffRecommended)) != 0:
-            click.secho("    Recommended property that are missing: " + str(list(diffRecommended)))
-        else:
-            click.secho("    The data has all the recommended property(ies).")
-
-
-        if len(errorRecommended) != 0:
-            click.secho("    Recommended property that has error: " +
-                        str(list(errorRecommended)))
-        else:
-            click.secho("    Implemented recommended property has no error.")
-
-        create_completeness_dir(
-            csv, result, "Recommended", "Missing", diffRecommended)
-        create_completeness_dir(csv, result, "Recommended",
-                                "Implemented", existRecommended)
-        create_completeness_dir(
-            csv, result, "Recommended", "Error", errorRecommended)
-
-    # Optional
-    click.secho("Marginality: Optional")
-    if noOptional == 0:
-        click.secho("    There are no optional property recommended by this profile.")
-        create_completeness_dir(
-            csv, result, "Optional", "Missing", "")
-        create_completeness_dir(csv, result, "Optional",
-                                "Implemented", "")
-        create_completeness_dir(
-            csv, result, "Optional", "Error", "")
-    else:
-        if len(list(diffOptional)) != 0:
-            click.secho("    Optional property that are missing: " + str(list(diffOptional)))
-        else:
-            click.secho("    The data has all the optional property(ies).")
-
-        if len(errorOptional) != 0:
-            click.secho("    Optional property that has error: " +
-                        str(list(errorOptional)))
-        else:
-            click.secho("    Implemented optional property has no error.")
-
-
-        create_completeness_dir(
-            csv, result, "Optional", "Missing", diffOptional)
-        create_completeness_dir(csv, result, "Optional",
-                                "Implemented", existOptional)
-        create_completeness_dir(
-            csv, result, "Optional", "Error", errorOptional)
-
-
-    # Extra properties not included in the Bioschemas profile
-    if len(list(extraProp)) == 0:
-        click.secho()
-        click.secho("There is no property name in the metadata outside of the Bioschemas profile.")
-    if len(list(extraProp)) != 0:
-        click.secho()
-        click.secho("These properties names are in the metadata but not in the Bioschemas profile:"+
-            str(list(extraProp)))
-
-    return result
+    marginality = marginality_sets(existProperty, diffKeys, listPath)
+    render_marginality(marginality)
+    return marginality_result(marginality, profileName, version, csv)
 
 def is_date(string, fuzzy=False):
     """
@@ -363,165 +226,223 @@ def is_date(string, fuzzy=False):
     except ValueError:
         return False
 
-# perform semantic check base on the relationship between property
-def date_semantic_check(data):
-   
-    # print("test")
+@functools.lru_cache(maxsize=None)
+def date_pairs():
+    """Return the (start, end) date property pairs in semanticPairDate.txt, the file is only read once"""
     with semanticPairDatePath.open() as f:
-        semanticPairDate = f.readlines()
-        f.close()
-
-    # semanticPairDate = filePath.read_text().split("\n")
-
-    for line in semanticPairDate:
-        pair = line.split()
-        start = pair[0]
-        end = pair[1]
-
-        if start in data.keys() and is_date(data.get(start)) is False:
-                click.secho("In property \"" + start + "\", \""
-                        + data.get(start)
-                        + "\" has incorrect data format, months should be between 1 and 12, date should be between 1 and 31")
-                click.secho("------")
-        if end in data.keys() and is_date(data.get(end)) is False:
-                click.secho("In property \"" + end + "\", \""
-                        + data.get(end)
-                        + "\" has incorrect data format, months should be between 1 and 12, date should be between 1 and 31")
-                click.secho("------")
+        return tuple(tuple(line.split()[:2]) for line in f if len(line.split()) >= 2)
+
+@functools.lru_cache(maxsize=65536)
+def parse_date(string):
+    """Parse a date string once, dates with a timezone are converted to UTC so any two dates can be compared
+
+    Returns:
+        datetime: The date, None if the string is not a date
+    """
+    try:
+        date = parse(string)
+    except (ValueError, OverflowError):
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date
+
+def date_checks(data, masterKeys, warnings, comparisons):
+    """Add the warnings of the date properties that are not dates to warnings, and the dates that need
+    to be compared to comparisons as (start date, end date, index of its warning, warning).
+    The index points to a None placeholder in warnings so the warnings keep the order of the properties.
+
+    Args:
+        data (dict): The metadata or a property value inside the metadata
+        masterKeys (list): The properties data is inside of, None for the metadata itself
+    """
+    for start, end in date_pairs():
+        dates = dict()
+        for name in (start, end):
+            if name in data and type(data[name]) is str:
+                dates[name] = parse_date(data[name])
+                if dates[name] is not None:
+                    continue
+                if masterKeys is None:
+                    warnings.append("In property \"" + name + "\", \""
+                            + data[name]
+                            + "\" has incorrect data format, months should be between 1 and 12, date should be between 1 and 31")
+                else:
+                    warnings.append("Inside property "+ str(masterKeys) + ",  \""
+                            + data[name] + "\"" + " for property \""
+                            + name
+                            + "\" has incorrect data format, months should be between 1 and 12, date should be between 1 and 31")
 #                as the date format check is done with the json schemas and incorrect property are removed
 #                there is no point to check formate again
-        if start in data.keys() and end in data.keys() and is_date(data.get(start)) and is_date(data.get(end)):
-                staS = parse(data.get(start))
-                endS = parse(data.get(end))
-#                    staS = datetime.datetime.strptime(data.get(start), '%Y-%m-%d')
-#                    endS = datetime.datetime.strptime(data.get(end), '%Y-%m-%d')
-                if staS > endS:
-                    click.secho("\"" + start + "\" : " + "\"" + data.get(start) + "\" is after \"" + end
-                            + "\" : " + "\"" + data.get(start) + "\", please double check.")
-                    click.secho("------")
+        if dates.get(start) is not None and dates.get(end) is not None:
+            if masterKeys is None:
+                message = ("\"" + start + "\" : " + "\"" + data[start] + "\" is after \"" + end
+                        + "\" : " + "\"" + data[start] + "\", please double check.")
+            else:
+                message = ("Inside property"+ str(masterKeys)+",""\"" + start + "\" : " + "\"" + data[start] + "\" is after \"" + end
+                        + "\" : " + "\"" + data[start] + "\", please double check.")
+            warnings.append(None)
+            comparisons.append((dates[start], dates[end], len(warnings)-1, message))
+
     for key, value in data.items():
         if type(value) is dict:
-            masterKeys = list()
-            masterKeys.append(key)
-            date_semantic_check_in_property(value, key, masterKeys)
+            if masterKeys is None:
+                date_checks(value, [key], warnings, comparisons)
+            else:
+                masterKeys.append(key)
+                date_checks(value, masterKeys, warnings, comparisons)
 
-# perform semantic check base on the relationship between property, inside other properties
-def date_semantic_check_in_property(data, key, masterKeys):
-    # filePath = "./src/Classes/semanticPairDate.txt"
-    with semanticPairDatePath.open() as f:
-        semanticPairDate = f.readlines()
-        f.close()
+# perform semantic check base on the relationship between property
+def date_semantic_check(data):
+    """Check the date properties are dates and are in the right order, such as startDate before endDate
 
-    for line in semanticPairDate:
-        pair = line.split()
-        start = pair[0]
-        end = pair[1]
+    Args:
+        data (dict): The metadata, without the property that has error
 
-#                as the date format check is done with the json schemas and incorrect property are removed
-#                there is no point to check formate again
-#                click.secho(data.get(start))
-#                click.secho(data.get(end))
-        if start in data.keys() and is_date(data.get(start)) is False:
-            click.secho("Inside property "+ masterKeys + ",  \""
-                    + data.get(start) + "\"" + " for property \""
-                    + start
-                    + "\" has incorrect data format, months should be between 1 and 12, date should be between 1 and 31")
-            click.secho("------")
-        if end in data.keys() and is_date(data.get(end)) is False:
-            click.secho("Inside property " + masterKeys+", \""
-                    + data.get(end)
-                    + "\"" + " for property \"" + end
-                    + "\" has incorrect data format, months should be between 1 and 12, date should be between 1 and 31")
-            click.secho("------")
-        if start in data.keys() and end in data.keys() and is_date(data.get(start)) and is_date(data.get(end)):
-            staS = parse(data.get(start))
-            endS = parse(data.get(end))
-            if staS > endS:
-                click.secho("Inside property"+ masterKeys+",""\"" + start + "\" : " + "\"" + data.get(start) + "\" is after \"" + end
-                        + "\" : " + "\"" + data.get(start) + "\", please double check.")
-    for key, value in data.items():
-        if type(value) is dict:
-#                 masterKey = ke
-            masterKeys.append(key)
-            date_semantic_check_in_property(value, key, masterKeys)
+    Returns:
+        list: The warning messages
+    """
+    warnings = list()
+    comparisons = list()
+    date_checks(data, None, warnings, comparisons)
+    for startDate, endDate, index, message in comparisons:
+        if startDate > endDate:
+            warnings[index] = message
+    return [warning for warning in warnings if warning is not None]
+
+def date_semantic_check_corpus(dataList):
+    """Same as date_semantic_check for many metadata at once, every date is parsed once
+    and all the start and end dates are compared together as NumPy datetime64 arrays
+
+    Args:
+        dataList (iterable): The metadata, without the property that has error
+
+    Returns:
+        list: The list of warning messages of each metadata
+    """
+    import numpy
+
+    warningsList = list()
+    startDates = list()
+    endDates = list()
+    places = list()
+    for n, data in enumerate(dataList):
+        warnings = list()
+        comparisons = list()
+        date_checks(data, None, warnings, comparisons)
+        for startDate, endDate, index, message in comparisons:
+            startDates.append(startDate)
+            endDates.append(endDate)
+            places.append((n, index, message))
+        warningsList.append(warnings)
+
+    if len(places) != 0:
+        after = numpy.array(startDates, dtype="datetime64[us]") > numpy.array(endDates, dtype="datetime64[us]")
+        for position in numpy.flatnonzero(after):
+            n, index, message = places[position]
+            warningsList[n][index] = message
+    return [[warning for warning in warnings if warning is not None] for warnings in warningsList]
 
 # loads the string from the file to a json object
 def path_to_dict(path):
+    """Load a metadata file, displaying the warnings about its property names, see load_metadata
+
+    Returns:
+        tuple: The metadata and the path of the file
+    """
     path = pathlib.Path(path)
-    orgString = path.read_text()
-    newDict = json.loads(orgString,
-                            object_pairs_hook=dict_raise_on_duplicates)
+    newDict, warnings = load_metadata(path.read_text())
+    render_key_warnings(warnings)
     return newDict, path
 
+def trusted_path_to_dict(path):
+    """Load a profile JSON schema made by buildprofile, without checking its property names
+
+    Returns:
+        tuple: The schema and the path of the file
+    """
+    path = pathlib.Path(path)
+    return json.loads(path.read_text()), path
+
+# profile schemas and their compiled validators shared by every validation in this process
+validatorCache = ValidatorCache(trusted_path_to_dict, config.VALIDATOR_CACHE_SIZE, config.PROFILE_COMPILED_EXT, config.PROFILE_LOC)
+profileIndex = ProfileIndex(config.PROFILE_LOC, config.PROFILE_EXT,
+                            config.PROFILE_MARG_LOC, config.PROFILE_MARG_EXT,
+                            config.METADATA_DEFAULT_PROP)
+
 def str_to_dict(orgString):
-    newDict = json.loads(orgString,
-                            object_pairs_hook=dict_raise_on_duplicates)
+    newDict, warnings = load_metadata(orgString)
+    render_key_warnings(warnings)
 #         click.secho(newDict)
     return newDict
 
 
-# supply method used to reject duplicate keys
-def dict_raise_on_duplicates(ordered_pairs):
-    """Reject duplicate keys."""
-    d = {}
-    schemaOrg = False
-    for k, v in ordered_pairs:
-        if re.search(r"\s", k):
-#             click.secho(k)
-            click.secho("Please remove the whitespace(s) in property name " + k+
-                  "the Validator will proceed without the whitespace(s)\n")
-            k = k.strip()
-        if re.search("[^a-zA-Z@\$]", k) != None and "conformsTo" not in k:
-#             click.secho(k)
-            click.secho("Please be noted there are non alphabetic character in property name " + k +
-                  "schema.org has no property name with non alphabetic character therefore the Bioschemas validator will not validate this property.")
-        if k in d:
-            click.secho("duplicate property: " + k +
-                        "the value for the last %r will be used" + k)
-        elif type(v) is dict:
-            masterKeys = list()
-            masterKeys.append(k)
-            d[k] = dict_raise_on_duplicates_recursive(v, masterKeys)
-        else:
-            d[k] = v
-    return d
-
-
-def dict_raise_on_duplicates_recursive(ordered_pairs, masterKeys):
-    """Reject duplicate keys."""
-    d = {}
-    # print(ordered_pairs)
-    for k, v in ordered_pairs.items():
-
-        if re.search(r"\s", k)!= None:
-#             click.secho("Please remove the whitespace in property name %r," % (k,),
-#                   "\n inside property" , masterKeys ,". The Validator will proceed without the whitespaces\n")
-#             k = k.strip()
-            click.secho(str(masterKeys))
-        if re.search("[^a-zA-Z@\$]", k) != None :
-#             click.secho(k,v)
-#             click.secho("Please be noted there are non alphabetic character in property name %r," % (k,),
-#                   "\n inside property" ,masterKeys ,". Schema.org has no property name with non alphabetic character therefore the Bioschemas validator will not validate this property.")
-            click.secho(str(masterKeys))
-        if k in d:
-#             click.secho("duplicate property: %r," % (k,), "inside property", masterKeys,", the value for the last %r will be used"% (k,))
-            click.secho(str(masterKeys))
-        elif type(v) is dict:
-            masterKeys.append(k)
-            d[k] = dict_raise_on_duplicates_recursive(v, masterKeys)
-        else:
-            d[k] = v
-    return d
+# a problem with a property name of the metadata
+# kind is "whitespace", "character" or "duplicate", path is the names of the properties the property is inside of
+KeyWarning = collections.namedtuple("KeyWarning", ["kind", "key", "path"])
+
+WHITESPACE = re.compile(r"\s")
+NON_ALPHABETIC = re.compile(r"[^a-zA-Z@$]")
+
+def load_metadata(orgString):
+    """Load metadata from a JSON string and check the property names of every object in the same pass.
+    The whitespaces around a property name are removed and the first value of a duplicate property is kept.
+
+    Args:
+        orgString (str): The metadata in JSON
+
+    Returns:
+        tuple: The metadata and the list of KeyWarning, in the order they are found in the string
+    """
+    # the warnings of each object, by id, until the object is put inside its parent
+    pending = dict()
+    warnings = list()
+
+    def adopt(key, value):
+        # the warnings of the objects inside value are now inside key
+        if type(value) is dict:
+            for warning in pending.pop(id(value), ()):
+                yield warning._replace(path=(key,) + warning.path)
+        elif type(value) is list and len(pending) != 0:
+            for item in value:
+                yield from adopt(key, item)
+
+    def check_pairs(orderedPairs):
+        d = {}
+        found = list()
+        for k, v in orderedPairs:
+            found.extend(adopt(k, v))
+            if WHITESPACE.search(k) is not None:
+                found.append(KeyWarning("whitespace", k, ()))
+                k = k.strip()
+            if NON_ALPHABETIC.search(k) is not None and "conformsTo" not in k:
+                found.append(KeyWarning("character", k, ()))
+            if k in d:
+                found.append(KeyWarning("duplicate", k, ()))
+            else:
+                d[k] = v
+        if len(found) != 0:
+            pending[id(d)] = found
+        return d
+
+    data = json.loads(orgString, object_pairs_hook=check_pairs)
+    warnings.extend(adopt(None, data))
+    # the path of the metadata itself is empty
+    return data, [warning._replace(path=warning.path[1:]) for warning in warnings]
+
+def render_key_warnings(warnings):
+    """Display the warnings found by load_metadata"""
+    for warning in warnings:
+        inside = "" if len(warning.path) == 0 else " inside property " + ".".join(warning.path)
+        if warning.kind == "whitespace":
+            click.secho("Please remove the whitespace(s) in property name " + warning.key + inside +
+                        ", the Validator will proceed without the whitespace(s)\n")
+        elif warning.kind == "character":
+            click.secho("Please be noted there are non alphabetic character in property name " + warning.key + inside +
+                        ", schema.org has no property name with non alphabetic character therefore the Bioschemas validator will not validate this property.")
+        elif warning.kind == "duplicate":
+            click.secho("duplicate property: " + warning.key + inside + ", the value of the first " + warning.key + " will be used")
 
 def hasNumbers(inputString):
      return bool(re.search(r'\d', inputString))
 
-def sortby(x):
-    try:
-        if x.split(".")[0] == "0":
-            x = x[x.index(".")+1:x.index("-")]
-        else:
-            x = x[:x.index(".")] + x[x.index("."):x.index("-")]
-        return float(x)
-    except ValueError:
-        return float('inf')
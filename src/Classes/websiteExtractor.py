@@ -1,9 +1,15 @@
-from usp.tree import sitemap_tree_for_homepage
 import pathlib
 import sys
-# ultimate_sitemap_parser
+from urllib.parse import urljoin
 from urllib.parse import urlparse
+
 import click
+import requests
+
+sys.path.append("./")
+import src.Classes.config as config
+from src.Classes.httpFetcher import HttpFetcher
+from src.Classes.sitemapExtractor import sitemapUrls
 # try:
 #     # python2
 #     from urlparse import urlparse
@@ -11,7 +17,66 @@ import click
 #     # python3
 #     from urllib.parse import urlparse
 
+
+def findSitemaps(websiteLink, fetcher):
+    """Return the sitemaps of a website, listed in its robots.txt or at the usual locations if it lists none
+
+    Args:
+        websiteLink (str): The url of the website
+        fetcher (HttpFetcher): Used to download the robots.txt
+
+    Returns:
+        list: The urls of the sitemaps
+    """
+    homepage = urlparse(websiteLink)._replace(path="/", params="", query="", fragment="").geturl()
+    sitemaps = list()
+    try:
+        robots = fetcher.get(urljoin(homepage, "robots.txt"))
+        if robots.status == 200:
+            for line in robots.text.splitlines():
+                if line.lower().startswith("sitemap:"):
+                    sitemap = urljoin(homepage, line.split(":", 1)[1].strip())
+                    if sitemap not in sitemaps:
+                        sitemaps.append(sitemap)
+    except requests.RequestException as error:
+        click.secho("Could not read the robots.txt of " + homepage + ": " + str(error), fg="yellow")
+    if len(sitemaps) == 0:
+        sitemaps = [urljoin(homepage, name) for name in config.SITEMAP_LOCATIONS]
+    return sitemaps
+
+
+def websiteUrls(websiteLink, fetcher=None):
+    """Read the urls of the webpages in the sitemaps of a website as they are downloaded
+
+    Args:
+        websiteLink (str): The url of the website
+        fetcher (HttpFetcher): Used to download the sitemaps, one is made from config.py if None
+
+    Yields:
+        str: The url of each webpage, each one once
+    """
+    ownFetcher = None
+    if fetcher is None:
+        fetcher = ownFetcher = HttpFetcher(config.HTTP_CONCURRENCY, config.HTTP_TIMEOUT,
+                                           config.HTTP_RETRIES, config.HTTP_BACKOFF)
+    try:
+        # the child sitemaps of the sitemap indexes are downloaded at the same time
+        yield from sitemapUrls(findSitemaps(websiteLink, fetcher), fetcher, fetcher.concurrency)
+    finally:
+        if ownFetcher is not None:
+            ownFetcher.close()
+
+
 def extractWebsite(websiteLink, printDetail=False):
+    """Write the urls of the webpages in the sitemaps of a website to a text file as they are read
+
+    Args:
+        websiteLink (str): The url of the website
+        printDetail (boolean): True to also display each url
+
+    Returns:
+        Path: The text file named after the website, in the current directory
+    """
     outputName = pathlib.Path(urlparse(websiteLink).netloc+".txt")
 
     if outputName.exists():
@@ -20,12 +85,10 @@ def extractWebsite(websiteLink, printDetail=False):
 
     print("Output location: " + str(outputName))
 
-    tree = sitemap_tree_for_homepage(websiteLink)
-    for page in tree.all_pages():
-        # print(type(page))
-        f.write(page.url + "\n")
+    for url in websiteUrls(websiteLink):
+        f.write(url + "\n")
         if printDetail:
-            print(page.url)
+            print(url)
     f.close()
     return(outputName)
 
@@ -1,57 +1,80 @@
 # from pathlib import Path
 import sys
 sys.path.append("./")
-from src.Classes.staticJSONLDExtractor import extract
-from src.Classes.formatToJSONLD import convertformattoJSONLD
+# the extractors, the RDF converter and the profile builder load heavy libraries,
+# they are imported inside the functions of the actions that need them so the other actions start faster
 from src.Classes.validator import validate
-from src.Classes.buildAProfile import build_profile
+from src.Classes.validator import validation_report
+from src.Classes.validationReport import render_report
 from src.Classes.validator import path_to_dict
-from src.Classes.sitemapExtractor import sitemapExtractor
-from src.Classes.websiteExtractor import extractWebsite
-
+from src.Classes.validator import str_to_dict
+from src.Classes.validator import validatorCache
+from src.Classes.csvSummary import CsvSummaryWriter
+from src.Classes.csvSummary import FIELDNAMES
+from src.Classes.csvSummary import csvRow
+from src.Classes.stageTimer import timings
+
+import collections
+import concurrent.futures
+import contextlib
 import csv
-import glob
+import functools
+import io
+import json
 import os
 import pathlib
 
 import click
 
 import src.Classes.config as config
-import pandas as pd
-import rdflib
 
 
 @click.command()
-@click.argument('action', type=click.Choice(['validate', 'buildprofile', 'tojsonld', 'sitemap']))
+@click.argument('action', type=click.Choice(['validate', 'buildprofile', 'tojsonld', 'sitemap', 'serve']))
 @click.option("--target_data",  default="",
-              help="The yml that need to be build or data that needs to be validated, can be the path to a file containing the metadata, a file containing a list of paths or a path to a directory")
+              help="The yml that need to be build or data that needs to be validated, can be the path to a file containing the metadata, a file containing a list of paths, a JSON Lines file (\"-\" for the standard input) or a path to a directory")
 @click.option("--convert", is_flag=True,
               help="Convert the metadata from other format such as NQuads to JSON-LD")
 @click.option("--csv", default="N", type=click.Choice(['N','num', 'name', 'all']),
-              help="Save a simplified output to a csv file, if multiple metadata were validated, both the individual and summary will be saved")
+              help="Save a simplified output to a csv file, if multiple metadata were validated a summary csv file is saved")
+@click.option("--csv_each", is_flag=True,
+              help="With --csv, also save one csv file next to each metadata validated")
 @click.option("--profile", default="N", 
               help="Set specific profile to validated against, needs to be a path to the profile JSON schema")
 @click.option("--static_jsonld", is_flag=True,
               help="A URL, A file with the URLs of the webpages or HTML files in local")
 @click.option("--sitemap_convert", is_flag=True,
               help="Wether the data is a sitemap or a web domain, if raised the url will be extracted from the sitemap")
+@click.option("--workers", default=1, type=click.IntRange(min=1),
+              help="Number of processes used to validate the metadata or build the profiles in parallel")
+@click.option("--rebuild", is_flag=True,
+              help="Build all the profiles again, even those that did not change since they were last built")
+@click.option("--port", default=config.SERVE_PORT, type=click.IntRange(min=0),
+              help="The port on localhost the serve action listens to")
+@click.option("--socket", default="",
+              help="The path of a Unix socket the serve action listens to instead of the port")
+@click.option("--timings", "timed", is_flag=True,
+              help="Display how long each stage of the validation took, by profile, at the end of the run")
 
 
 
-def choose(action, target_data, static_jsonld, csv, profile, convert, sitemap_convert):
+def choose(action, target_data, static_jsonld, csv, profile, convert, sitemap_convert, workers, csv_each, rebuild, port, socket, timed):
     if action == 'buildprofile':
         click.echo('Action: %s' % action)
         if target_data == "":
-            buildProfile('all')
+            buildProfile('all', workers, rebuild)
         else:
-            buildProfile(target_data)
+            buildProfile(target_data, workers, rebuild)
     elif action == 'validate':
             click.echo('Action: %s' % action)
             if target_data == "":
                 click.echo("Missing target_data parameter")
                 exit()
+            timings.enable(timed)
             validateData(target_data, static_jsonld, csv,
-                         profile, convert, sitemap_convert)
+                         profile, convert, sitemap_convert, workers, csv_each)
+            if timed:
+                timings.report()
 
     elif action == 'tojsonld':
             click.echo('Action: %s' % action)
@@ -65,48 +88,52 @@ def choose(action, target_data, static_jsonld, csv, profile, convert, sitemap_co
 
         sitemapExtract(target_data)
 
+    elif action == "serve":
+        click.echo('Action: %s' % action)
+        from src.Classes.validationServer import serve
+        serve(port, socket)
+
 def sitemapExtract(target_data):
-    if pathlib.Path(target_data).suffix == ".xml":
+    if pathlib.Path(target_data).suffix == ".xml" or pathlib.Path(target_data).suffixes[-2:] == [".xml", ".gz"]:
+        from src.Classes.sitemapExtractor import sitemapExtractor
         return sitemapExtractor(target_data)
     else:
+        from src.Classes.websiteExtractor import extractWebsite
         return extractWebsite(target_data, "")
 
-def buildProfile(profile_to_make):
+def buildProfile(profile_to_make, workers=1, rebuild=False):
     """ROUTE ONE 
         The first step for using this validation suite. 
         This will build the JSON schema for Bioschema profiles necessary for validation 
 
     Args:
         profile_to_make (string): A path to a file with the list of profile YML file that want to build instead of all the profile in config.YML_LOC
+        workers(int): The number of processes building the profiles in parallel, 1 to build them one by one
+        rebuild(boolean): True to build all the profiles, otherwise only the ones that changed since they were last built
     """
 #     the validating of the schemas is done as part of build_profile method
+    from src.Classes.buildAProfile import build_profile
+    from src.Classes.buildScheduler import build_profiles
     if profile_to_make != 'all':
         path = pathlib.Path(profile_to_make)
         if path.suffix == ".html":
             return build_profile(path)
         elif path.suffix == ".txt":
             with path.open() as f:
-                profileList = f.readlines()
+                profileList = [line.rstrip() for line in f.readlines() if line.strip() != ""]
             if len(profileList) == 0:
                 click.secho(
                     "There is no file to be converted in " + config.YML_LOC, fg='yellow')
-            for line in profileList:
-                click.echo(line)
-                build_profile(pathlib.Path(line.rstrip()))
-                click.echo("---------------------------------")
-                continue
+            build_profiles(profileList, workers, rebuild)
 
     else:
         path = pathlib.Path(config.YML_LOC)
-        for line in path.glob('**/*.html'):
-            click.echo(line)
-            build_profile(line)
-            click.echo("---------------------------------")
+        build_profiles(sorted(path.glob('**/*.html')), workers, rebuild)
 
     return 0
 
 
-def validateData(target_data, static_jsonld, csv, profile, convert, sitemap_convert):
+def validateData(target_data, static_jsonld, csv, profile, convert, sitemap_convert, workers=1, csvEach=False):
     """Validate metadata using the information taken from the target_data path
 
     Args:
@@ -116,6 +143,7 @@ def validateData(target_data, static_jsonld, csv, profile, convert, sitemap_conv
         profile (string): A path to the profile JSON schema the validation will use(instead of default profile base on the metadata type)
         convert (boolean): True is the metadata is in a RDF type not JSONLD
         sitemap_convert(boolean): True if the url of the metadata need to be extrated from the sitemap or a webdomain
+        workers(int): The number of processes validating the metadata in parallel, 1 to validate them one by one
     """
     try:
         fileDir = False
@@ -139,20 +167,25 @@ def validateData(target_data, static_jsonld, csv, profile, convert, sitemap_conv
                 # the target data will now be a path to a file with a list of urls that then needs to be extracted
                 target_data = sitemapExtract(target_data)
             # depends on the target data, it could be a dir(if a dir was created), or a list(if the dir exist already)
+            from src.Classes.staticJSONLDExtractor import extract
             newCommandFileName = extract(target_data)
             if type(newCommandFileName) is list:
                 target_data = pathlib.Path(target_data)
             target_data = newCommandFileName
 
-            if target_data == "":
+            # nothing was extracted, for example if none of the webpages could be downloaded
+            if target_data == "" or target_data == list():
                 click.echo("No data to be validated.")
                 return -1
             
         if profileSpecific:
-            schema, schemaPath = path_to_dict(pathlib.Path(profile))
+            schema, schemaPath = validatorCache.schema(pathlib.Path(profile))
 
         
 
+        if type(target_data) is not list and (str(target_data) == "-" or pathlib.Path(str(target_data)).suffix in config.JSON_LINES_EXT):
+            return validateJsonLines(target_data, csv, profile, workers, csvEach)
+
         if type(target_data) is not list:
             if os.path.isdir(target_data):
                 fileDir = True
@@ -167,20 +200,16 @@ def validateData(target_data, static_jsonld, csv, profile, convert, sitemap_conv
                 if "{" in dataList[0] or pathlib.Path(target_data).suffix == config.METADATA_EXT:
     
                     click.echo("The target metadata is " + str(target_data))
-                    data, dataPath = path_to_dict(pathlib.Path(target_data))
-                    if csvNeeded:
-                        blockPrint()
-                    click.echo("###########Start Validation#############")
-                    if profileSpecific:
-                        click.echo("Validating againest ", schemaPath)
-
-                        result = validate(data, csv, schema, schemaPath)
-                    else:
-                        result = validate(data, csv)
-
-                    if csvNeeded:
-                        enablePrint()
-                        csvWriter(result, target_data)
+                    with timings.record():
+                        with timings.stage("load"):
+                            data, dataPath = path_to_dict(pathlib.Path(target_data))
+                        with hideOutput(csvNeeded):
+                            click.echo("###########Start Validation#############")
+                            result = validateMetadata(data, csv, profile)
+
+                        if csvNeeded:
+                            with timings.stage("csv"):
+                                csvWriter(result, target_data)
                     click.echo("###########End Validation#############\n")
                     return 
                     # end of output if a single file is being validated
@@ -201,55 +230,9 @@ def validateData(target_data, static_jsonld, csv, profile, convert, sitemap_conv
             return -1
     
 
-        dataName = ""
-
-        for line in dataList:
-            if type(line) is not str:
-                line = str(line)
-            print("Validating:",line)
-            if type(line) is str and len(line.split(" "))>1:
-                containProfile = True
-                schemaName = line.split(" ")[0]
-                dataName = line.split(" ")[1].strip()
-            else:
-                dataName = line
-                containProfile = False
-            if type(dataName) is str:
-                dataName = pathlib.Path(dataName.rstrip())
-
-            click.echo("###########Start Validation#############")
-            if csvNeeded:
-                blockPrint()
-
-            if fileDir is False and containProfile is True:
-                click.echo(schemaName, dataName)
-                data, dataPath = path_to_dict(dataName)
-                if profileSpecific:
-                    click.echo("Validating againest ", schemaPath)
-
-                    result = validate(data, csv, schema, schemaPath)
-                else:
-                    schema , schemaPath = path_to_dict(schemaName)
-
-    #             click.echo(schemaName)
-                    result = validate(data,csv, schema, schemaPath)
-            elif containProfile is False:
-    #             dataName = line.strip()
-    #             if type(dataName) is str:
-    #                 dataName = pathlib.Path(dataName)
-                data, dataPath = path_to_dict(dataName)
-                if profileSpecific:
-                    click.echo("Validating againest ", schemaPath)
-                    result = validate(data, csv, schema, schemaPath)
-                else:
-                    result = validate(data, csv)
-            if csvNeeded:
-                enablePrint()
-                # new = pd.DataFrame.from_dict(result)
-                csvWriter(result, dataName)
-            click.echo("###########End Validation#############\n")
-        if csvNeeded:
-            csvBulkWriter(dataName)
+        records = ((line, line) for line in dataList)
+        validateFunction = functools.partial(validateRecord, csv=csv, profile=profile, fileDir=fileDir)
+        validateBatch(records, validateFunction, csv, profile, workers, csvEach)
         if type(target_data) is not list and os.path.isfile(target_data):
                 f.close()
         return 0 # returnCode
@@ -274,6 +257,235 @@ def validateData(target_data, static_jsonld, csv, profile, convert, sitemap_conv
         click.secho("Error:" + errorMessage, fg="red")
         return -1
 
+def validateMetadata(data, csv, profile, schemaName=None):
+    """Validate one metadata already loaded into a dict
+
+    Args:
+        data (dict): The metadata
+        csv (string): if only the marginality report is needed, it will include only number, properties names or both
+        profile (string): A path to the profile JSON schema the validation will use, "N" to use the profile of the metadata
+        schemaName (string): A path to the profile JSON schema given next to the metadata in a file of paths
+
+    Returns:
+        dict: The validation result
+    """
+    schema, schemaPath = None, ""
+    if profile != "N":
+        schema, schemaPath = validatorCache.schema(pathlib.Path(profile))
+        click.echo("Validating againest " + str(schemaPath))
+    elif schemaName is not None:
+        schema , schemaPath = validatorCache.schema(schemaName)
+    report = validation_report(data, schema, schemaPath)
+    # only the marginality result is kept in a csv file, the report does not need to be displayed
+    if csv == "N":
+        render_report(report)
+    return report.marginality_result(csv)
+
+
+def validateRecord(line, csv, profile, fileDir):
+    """Validate one metadata of a batch
+
+    Args:
+        line (str/Path): A path to the metadata, or a path to a profile JSON schema and a path to the metadata separated by a space
+        csv (string): if only the marginality report is needed, it will include only number, properties names or both
+        profile (string): A path to the profile JSON schema the validation will use, "N" to use the profile of the metadata
+        fileDir (boolean): True if the line comes from a directory, it then never contains a profile path
+
+    Returns:
+        tuple: The path to the metadata and the validation result
+    """
+    line = str(line)
+    schemaName = None
+    if fileDir is False and len(line.split(" "))>1:
+        schemaName = line.split(" ")[0]
+        dataName = pathlib.Path(line.split(" ")[1].strip())
+        click.echo(schemaName + " " + str(dataName))
+    else:
+        dataName = pathlib.Path(line.rstrip())
+
+    with timings.stage("load"):
+        data, dataPath = path_to_dict(dataName)
+    return dataName, validateMetadata(data, csv, profile, schemaName)
+
+
+def validateJsonLine(record, csv, profile):
+    """Validate one line of a JSON Lines file
+
+    Args:
+        record (tuple): The name given to the metadata and the line holding it
+        csv (string): if only the marginality report is needed, it will include only number, properties names or both
+        profile (string): A path to the profile JSON schema the validation will use, "N" to use the profile of the metadata
+
+    Returns:
+        tuple: The name of the metadata and the validation result, None if the line is not a JSON object
+    """
+    dataName, text = record
+    try:
+        with timings.stage("load"):
+            data = str_to_dict(text)
+    except json.JSONDecodeError as error:
+        click.secho("This line is not valid JSON and will not be validated: " + str(error), fg="red")
+        return dataName, None
+    if type(data) is not dict:
+        click.secho("This line is not a JSON object and will not be validated.", fg="red")
+        return dataName, None
+    return dataName, validateMetadata(data, csv, profile)
+
+
+def jsonLinesRecords(stream, name):
+    """Read a JSON Lines file one line at a time
+
+    Args:
+        stream (file): The opened JSON Lines file or the standard input
+        name (Path): The path of the file, used to name each metadata after its line number
+
+    Yields:
+        tuple: A label to display and the record given to validateJsonLine
+    """
+    for number, text in enumerate(stream, start=1):
+        if text.strip() == "":
+            continue
+        dataName = name.parent.joinpath(name.stem + "_" + str(number))
+        yield str(name) + " line " + str(number), (dataName, text)
+
+
+def validateCaptured(validateFunction, record):
+    """Run a validation in a worker process and keep what it displays so it can be shown in order
+
+    Returns:
+        tuple: The label of the record, the name of the metadata, the validation result, the output of the validation
+               and the stage timings of the validation, see StageTimings.drain
+    """
+    label, item = record
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), timings.record():
+        dataName, result = validateFunction(item)
+    return label, dataName, result, output.getvalue(), timings.drain()
+
+
+def warmWorker(profile, timed=False):
+    """Load and compile the profile given with --profile once when a worker process starts,
+    and time the stages of the validations if --timings is used
+    """
+    timings.enable(timed)
+    if profile != "N":
+        validatorCache.validator(pathlib.Path(profile))
+
+
+def orderedMap(executor, function, iterable, window):
+    """Same as executor.map, but only keeps window tasks in flight so the iterable is read as the results are used
+
+    Args:
+        executor (Executor): The pool the tasks are submitted to
+        function (function): Called with each item of the iterable
+        iterable (iterable): The items to process
+        window (int): The maximum number of tasks submitted but not yet returned
+
+    Yields:
+        The result of each item, in the order of the iterable
+    """
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def validateBatch(records, validateFunction, csv, profile, workers, csvEach=False):
+    """Validate a batch of metadata one by one or over a pool of worker processes.
+    The reports and csv rows are produced in the same order as the records,
+    the csv rows are written to mergedResult.csv next to the first metadata as they arrive.
+
+    Args:
+        records (iterable): Tuples of a label to display and the item given to validateFunction
+        validateFunction (function): Takes an item and returns the name of the metadata and the validation result
+        csv (string): if only the marginality report is needed, it will include only number, properties names or both
+        profile (string): A path to the profile JSON schema the validation will use, "N" to use the profile of the metadata
+        workers (int): The number of worker processes, 1 to validate in this process
+        csvEach (boolean): True to also save one csv file next to each metadata
+
+    Returns:
+        Path: The name of the last metadata validated
+    """
+    csvNeeded = csv != "N"
+    dataName = ""
+    with CsvSummaryWriter("mergedResult.csv", config.CSV_FLUSH_ROWS) as summary:
+        if workers > 1:
+            task = functools.partial(validateCaptured, validateFunction)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=warmWorker, initargs=(profile, timings.enabled)) as pool:
+                for label, dataName, result, output, samples in orderedMap(pool, task, records, workers*4):
+                    timings.merge(samples)
+                    print("Validating:",label)
+                    click.echo("###########Start Validation#############")
+                    if csvNeeded:
+                        with timings.stage("csv"):
+                            csvSummaryRow(summary, result, dataName, csvEach)
+                    else:
+                        click.echo(output, nl=False)
+                    click.echo("###########End Validation#############\n")
+        else:
+            for label, item in records:
+                print("Validating:",label)
+                click.echo("###########Start Validation#############")
+                with timings.record():
+                    with hideOutput(csvNeeded):
+                        dataName, result = validateFunction(item)
+                    if csvNeeded:
+                        with timings.stage("csv"):
+                            csvSummaryRow(summary, result, dataName, csvEach)
+                click.echo("###########End Validation#############\n")
+
+    if csvNeeded:
+        if summary.path is None:
+            click.echo("There is no csv result for the metadata validated.")
+        else:
+            click.echo("Merged CSV file location: " + str(summary.path))
+    return dataName
+
+
+def csvSummaryRow(summary, result, dataName, csvEach):
+    """Add the validation result of one metadata to the summary csv file, and to its own csv file if csvEach is True
+
+    Args:
+        summary (CsvSummaryWriter): The summary of the batch
+        result (dict): The marginality result returned by validator.validate
+        dataName (Path): The path to the metadata validated
+        csvEach (boolean): True to also save the result next to the metadata
+    """
+    if csvEach:
+        csvWriter(result, dataName)
+        # csvWriter already explained why there is no row
+        if result == 0:
+            return
+    summary.writerow(result, dataName)
+
+
+def validateJsonLines(target_data, csv, profile, workers, csvEach=False):
+    """Validate a JSON Lines file, or the standard input if target_data is "-", one line at a time
+
+    Args:
+        target_data (string): The path to the JSON Lines file
+        csv (string): if only the marginality report is needed, it will include only number, properties names or both
+        profile (string): A path to the profile JSON schema the validation will use, "N" to use the profile of the metadata
+        workers (int): The number of worker processes, 1 to validate in this process
+        csvEach (boolean): True to also save one csv file per line of the JSON Lines file
+    """
+    validateFunction = functools.partial(validateJsonLine, csv=csv, profile=profile)
+    if target_data == "-":
+        click.echo("Reading JSON Lines from the standard input")
+        validateBatch(jsonLinesRecords(sys.stdin, pathlib.Path("stdin")),
+                      validateFunction, csv, profile, workers, csvEach)
+    else:
+        click.echo(str(target_data) + " is a JSON Lines file")
+        path = pathlib.Path(target_data)
+        with path.open() as stream:
+            validateBatch(jsonLinesRecords(stream, path),
+                          validateFunction, csv, profile, workers, csvEach)
+    return 0
+
+
 def toJsonLD(target_data, action):
     """Convert the file from RDF serialization to JSON-LD
 
@@ -282,6 +494,8 @@ def toJsonLD(target_data, action):
     Returns:
         list: A list of the result JSONLD file
     """
+    import rdflib
+    from src.Classes.formatToJSONLD import convertformattoJSONLD
     if type(target_data) is str:
         target_data = pathlib.Path(target_data)
     if target_data.is_dir():
@@ -339,22 +553,14 @@ def toJsonLD(target_data, action):
         return -1
 
 
-def blockPrint():
-    """Stops the output displaying on the terminal
-    """
-    global nullOutput
-    nullOutput = open(os.devnull, 'w')
-    sys.stdout = nullOutput
-
-# Restore
-
+def hideOutput(hidden):
+    """Stops the output displaying on the terminal inside a with block if hidden is True
 
-def enablePrint():
-    """Lets the output displaying on the terminal
+    Args:
+        hidden (boolean): True to hide the output
     """
-    global nullOutput
-    nullOutput.close()
-    sys.stdout = sys.__stdout__
+    # print and click.echo write nothing while sys.stdout is None
+    return contextlib.redirect_stdout(None) if hidden else contextlib.nullcontext()
 
 def csvWriter(resultdict, name):
     """Takes the resultdict which is the validation result on validation and save it to a csv file.
@@ -368,59 +574,19 @@ def csvWriter(resultdict, name):
 
         return 0
     elif resultdict != None:
-        # click.echo(resultdict)
-
-        resultdict["File Name"] = name
-        for keyName in resultdict.keys():
-            if keyName == "Minimum" or keyName == "Recommended" or keyName == "Optional":
-                newString = ""
-                for k, v in resultdict[keyName].items():
-                    newString = newString + "\n" + k + ": " + str(v)
-                resultdict[keyName] = newString.strip()
-
-        # click.echo(resultdict)
+        row = csvRow(resultdict, name)
 
         if type(name) is str:
             name = pathlib.Path(name)
         name = str(name.parent.joinpath(name.stem))
 
         with open(name + ".csv", "w") as csvfile:
-            fieldnames = ["File Name", "Profile Name", "Profile Version",
-                "Valid", "Minimum", "Recommended", "Optional"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
             writer.writeheader()
-            writer.writerows([resultdict])
+            writer.writerows([row])
             click.echo("CSV file location: " + name + ".csv")
 
         return 1
 
-
-def csvBulkWriter(name):
-    """Merge the csv in the same directory into one for easy viewing
-
-    Args:
-        name ([Path]): a PATH to directory
-    """
-    if type(name) is str:
-        name = pathlib.Path(name)
-    click.echo(name)
-    path = name.parent
-    all_files = glob.glob(str(path.joinpath("*.csv")))
-    if len(all_files) == 0:
-        click.echo("There is no csv file available in path "+str(path)+".")
-        return
-    df_from_each_file = (pd.read_csv(f, sep=',') for f in all_files)
-    df_merged = pd.concat(df_from_each_file, ignore_index=True)
-    resultPath = path.joinpath("mergedResult.csv")
-    if resultPath.exists():
-        print(resultPath, "exist already")
-        resultPath.unlink()
-        if resultPath.exists() is False:
-            click.echo("It has been deleted")
-    # path.joinpath("mergedResult.csv").unlink(missing_ok=True)
-
-    df_merged.to_csv(str(resultPath))
-    click.echo("Merged CSV file location: " + str(resultPath))
-
 if __name__ == '__main__':
     choose()
@@ -0,0 +1,157 @@
+"""Times each stage of the validation pipeline on the fixtures in test/metadata_lib and test/profile_lib.
+
+Run from the root of the repository:
+    python test/benchmark/BenchmarkStages.py --output=benchmark.json
+    python test/benchmark/BenchmarkStages.py --baseline=benchmark.json
+
+The results are saved as JSON, with the seconds of one call of each stage. With a baseline, the exit code
+is 1 if the median of a stage is slower than the baseline by more than the tolerance.
+"""
+import contextlib
+import io
+import json
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import click
+
+sys.path.append("./")
+import src.Classes.config as config
+from src.Classes.validator import path_to_dict
+from src.Classes.validator import trusted_path_to_dict
+from src.Classes.validator import validation_report
+from src.Classes.validator import check_completeness
+from src.Classes.validator import date_semantic_check
+from src.Classes.validator import validatorCache
+from src.Classes.validator import profileIndex
+from src.Classes.profileYmlToDict import separateSpecAndMapping
+from src.Classes.profileYmlToDict import tranform_yml_to_dict
+from src.Classes.buildAProfile import build_profile
+from src.Classes.formatToJSONLD import convertformattoJSONLD
+from src.command import csvWriter
+
+RECORD = "test/metadata_lib/dataset_metadata/datasetReal.txt"
+PROFILE = "profile_json/Dataset/0.3-RELEASE-2019_06_14.json"
+MARGINALITY = "profile_marginality/Dataset/0.3-RELEASE-2019_06_14.txt"
+PROFILE_YML = "test/profile_lib/correct_format_profile_yml.html"
+NQUADS = "test/metadata_lib/format_NQuads/3.nq"
+
+
+def measure(function, repeat):
+    """Return the seconds of one call of function, from repeat runs of enough calls to take at least 0.2s each"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    runs = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {"calls": number * repeat, "min": min(runs), "median": statistics.median(runs), "max": max(runs)}
+
+
+def stages(workDir):
+    """Return the name and the function of each stage, the functions are called once before they are timed
+
+    Args:
+        workDir (Path): A temporary directory for the files the stages write
+    """
+    data = path_to_dict(RECORD)[0]
+    schema, schemaPath = validatorCache.schema(pathlib.Path(PROFILE))
+    _, compiled = validatorCache.validator(schemaPath)
+    draft7 = validatorCache.compile(schema, schemaPath)
+    result = validation_report(data).marginality_result("all")
+    yml = pathlib.Path(PROFILE_YML).read_text()
+    propertyInfos = separateSpecAndMapping(yml)[1].split("- property: ")[1:]
+    nquads = workDir / "nquads" / pathlib.Path(NQUADS).name
+    nquads.parent.mkdir()
+    shutil.copy(NQUADS, nquads)
+
+    def resolve_profile():
+        profileIndex.profile_path("Dataset", profileIndex.latest("Dataset"))
+
+    def cli_validate():
+        # a new process, so the imports of command.py are timed with the validation
+        subprocess.run([sys.executable, "src/command.py", "validate", "--target_data=" + RECORD],
+                       capture_output=True, check=True)
+
+    # built to a profile directory named after the temporary directory, removed at the end
+    ymlCopy = pathlib.Path("test", workDir.name, pathlib.Path(PROFILE_YML).name)
+    ymlCopy.parent.mkdir()
+    shutil.copy(PROFILE_YML, ymlCopy)
+
+    return [
+        ("path_to_dict_record", lambda: path_to_dict(RECORD)),
+        ("path_to_dict_profile", lambda: trusted_path_to_dict(PROFILE)),
+        ("resolve_profile", resolve_profile),
+        ("draft7_construct", lambda: validatorCache.compile(schema, schemaPath)),
+        ("draft7_iter_errors", lambda: list(draft7.iter_errors(data))),
+        ("compiled_iter_errors", lambda: list(compiled.iter_errors(data))),
+        ("validation_report", lambda: validation_report(data)),
+        ("check_completeness", lambda: check_completeness(list(data.keys()), set(), MARGINALITY, "Dataset", "0.3-RELEASE-2019_06_14", "all")),
+        ("date_semantic_check", lambda: date_semantic_check(data)),
+        ("csv_writer", lambda: csvWriter(result, workDir / "record")),
+        ("tranform_yml_to_dict", lambda: [tranform_yml_to_dict(propertyInfo) for propertyInfo in propertyInfos]),
+        ("build_profile", lambda: build_profile(ymlCopy)),
+        ("convertformattoJSONLD", lambda: convertformattoJSONLD(nquads, "nquads")),
+        ("cli_validate", cli_validate)]
+
+
+def run(repeat):
+    """Time every stage
+
+    Returns:
+        dict: The results of each stage, see measure, or the error of the stages that failed
+    """
+    results = dict()
+    workDir = pathlib.Path(tempfile.mkdtemp(prefix="benchmark"))
+    try:
+        # the stages display their usual output, it is not part of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, function in stages(workDir):
+                try:
+                    function()
+                    results[name] = measure(function, repeat)
+                except Exception as error:
+                    results[name] = {"error": repr(error)}
+    finally:
+        shutil.rmtree(workDir)
+        for location in [config.PROFILE_LOC, config.PROFILE_MARG_LOC, "test"]:
+            shutil.rmtree(pathlib.Path(location) / workDir.name, ignore_errors=True)
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """Return the stages whose median is more than tolerance times the median of the baseline"""
+    slower = list()
+    for name, result in results.items():
+        before = baseline.get(name, {})
+        if "median" in result and "median" in before and result["median"] > before["median"] * tolerance:
+            slower.append(name)
+    return slower
+
+
+@click.command()
+@click.option("--output", default="", help="The JSON file the results are saved to, printed if not set")
+@click.option("--baseline", default="", help="A JSON file of earlier results to compare with")
+@click.option("--tolerance", default=1.5, type=click.FloatRange(min=1),
+              help="How many times slower than the baseline a stage can be")
+@click.option("--repeat", default=5, type=click.IntRange(min=1), help="The number of times each stage is timed")
+def main(output, baseline, tolerance, repeat):
+    results = {"python": platform.python_version(), "platform": platform.platform(), "unit": "seconds per call",
+               "stages": run(repeat)}
+    text = json.dumps(results, indent=2)
+    if output != "":
+        pathlib.Path(output).write_text(text + "\n")
+    else:
+        click.echo(text)
+    if baseline != "":
+        slower = regressions(results["stages"], json.loads(pathlib.Path(baseline).read_text())["stages"], tolerance)
+        for name in slower:
+            click.secho("Slower than the baseline: " + name, fg="red", err=True)
+        sys.exit(1 if slower else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ import sys
 sys.path.append("./")
 import src.command as command
 from src.Classes.staticJSONLDExtractor import extract
+from src.Classes.buildScheduler import build_profiles, output_paths
 # import src.Classes.config as config
 import testingConfig as testConfig
 
@@ -9,6 +10,8 @@ import unittest
 import pathlib
 import os
 import json
+import csv
+import subprocess
 import click
 def blockPrint():
     """Stops the output displaying on the terminal
@@ -28,13 +31,13 @@ def enablePrint():
     sys.stdout = sys.__stdout__
 
 
-def testValidation(action, target_data="", static_jsonld=False, csv=False, profile="N", convert=False, sitemap_convert=False):
+def testValidation(action, target_data="", static_jsonld=False, csv=False, profile="N", convert=False, sitemap_convert=False, workers=1):
     blockPrint()
     if action == 'buildprofile':
         return command.buildProfile(target_data)
 
     elif action == 'validate':
-        return command.validateData(target_data, static_jsonld, csv, profile, convert, sitemap_convert)
+        return command.validateData(target_data, static_jsonld, csv, profile, convert, sitemap_convert, workers)
 
     elif action == 'tojsonld':
         return command.toJsonLD(target_data, action)
@@ -125,6 +128,22 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(code, expected)
         cleanupProfileMade(target)
 
+    def testBuildProfileIncremental(self):
+        target = "test/profile_lib/demo_profile.txt"
+        paths = [pathlib.Path(line) for line in pathlib.Path(target).read_text().split()]
+        released = [path for path in paths if "RELEASE" in path.name]
+        blockPrint()
+        codes = build_profiles(paths, rebuild=True)
+        # the profiles that did not change are not built again
+        skipped = build_profiles(paths)
+        output_paths(released[0])[1].unlink()
+        removed = build_profiles(paths)
+        enablePrint()
+        self.assertEqual([codes[path] for path in released], [0]*len(released))
+        self.assertTrue(all(path not in skipped for path in released))
+        self.assertEqual([path for path in released if path in removed], released[:1])
+        cleanupProfileMade(target)
+
     # @unittest.skip
     def testCLIBuildProfileCorrect(self):
         action = "buildprofile"
@@ -270,6 +289,66 @@ class TestIntegration(unittest.TestCase):
         enablePrint()
         self.assertEqual(code, expected)
 
+    def testCLIMetadataListParallel(self):
+        action = "validate"
+        target = pathlib.Path("testOutput/dataset_list.txt")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # copied so the csv files written next to the metadata stay in testOutput
+        dataList = list()
+        for path in sorted(pathlib.Path("test/metadata_lib/dataset_metadata").glob("*.txt")):
+            dataList.append(target.parent / path.name)
+            dataList[-1].write_text(path.read_text())
+        target.write_text("\n".join(str(path) for path in dataList) + "\n")
+        # the worker processes give the same csv rows as a sequential run, in the order of the list
+        rows = dict()
+        for workers in [1, 2]:
+            code = testValidation(action, target_data=str(target), csv="num", workers=workers)
+            enablePrint()
+            self.assertEqual(code, 0)
+            with target.parent.joinpath("mergedResult.csv").open() as f:
+                rows[workers] = list(csv.reader(f))
+            target.parent.joinpath("mergedResult.csv").unlink()
+        self.assertEqual(len(rows[1]), len(dataList) + 1)
+        self.assertEqual(rows[2], rows[1])
+        cleanup()
+
+    def testCLIMetadataJsonLines(self):
+        action = "validate"
+        target = pathlib.Path("testOutput/dataset.jsonl")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        dataList = sorted(pathlib.Path("test/metadata_lib/dataset_metadata").glob("*.txt"))
+        target.write_text("".join(json.dumps(json.loads(path.read_text())) + "\n" for path in dataList))
+        code = testValidation(action, target_data=str(target), csv="N")
+        enablePrint()
+        self.assertEqual(code, 0)
+        cleanup()
+
+    def testCLIMetadataJsonLinesCSV(self):
+        action = "validate"
+        target = pathlib.Path("testOutput/dataset.jsonl")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # csv files already in the directory are not in the summary
+        target.parent.joinpath("unrelated.csv").write_text("File Name\nunrelated\n")
+        dataList = sorted(pathlib.Path("test/metadata_lib/dataset_metadata").glob("*.txt"))
+        target.write_text("".join(json.dumps(json.loads(path.read_text())) + "\n" for path in dataList))
+        code = testValidation(action, target_data=str(target), csv="num")
+        enablePrint()
+        self.assertEqual(code, 0)
+        with target.parent.joinpath("mergedResult.csv").open() as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row["File Name"] for row in rows],
+                         [str(target.parent.joinpath("dataset_" + str(i+1))) for i in range(len(dataList))])
+        self.assertEqual(sorted(path.name for path in target.parent.glob("*.csv")), ["mergedResult.csv", "unrelated.csv"])
+        cleanup()
+
+    def testCLIStartupImports(self):
+        # the libraries of the other actions are not imported to validate a file
+        modules = subprocess.run([sys.executable, "-c", "import sys; import src.command; print(' '.join(sorted(sys.modules)))"],
+                                 capture_output=True, text=True, check=True).stdout.split()
+        for heavy in ["extruct", "bs4", "rdflib", "pyld", "usp", "pandas", "requests", "jsonschema"]:
+            self.assertNotIn(heavy, modules)
+        # the time the validation takes from the start of the process is the cli_validate stage of test/benchmark
+
     def testCLISitemapExtractor(self):
         action = "sitemap"
         target = "test/sitemap/sitemap_index_shorten.xml"
@@ -4,9 +4,36 @@ import sys
 import json
 import pathlib
 import os
+import collections
+import tempfile
+import shutil
+import gzip
+import time
+import threading
+import http.server
+import http.client
+from urllib.parse import quote
 sys.path.append("./")
 from src.Classes.validator import check_completeness
+from src.Classes.validator import path_to_dict
+from src.Classes.validator import validation_report
+from src.Classes.validator import date_semantic_check, date_semantic_check_corpus
+from src.Classes.validator import load_metadata, KeyWarning
+from src.Classes.validator import validate
+from src.Classes.validationServer import ValidationServer
+from src.Classes.profileCache import ValidatorCache, ProfileIndex, ProfileMarginality
+from src.Classes.schemaCompiler import CompiledValidator
 from src.Classes.staticJSONLDExtractor  import extract
+from src.Classes.staticJSONLDExtractor import loadPage
+from src.Classes.staticJSONLDExtractor import scanJsonLd, extractData, closeHtml, htmlText
+import src.Classes.config as config
+from src.Classes.httpFetcher import HttpFetcher, HttpCache
+from src.Classes.profileYmlToDict import tranform_yml_to_dict
+from src.Classes.buildScheduler import build_levels, dependency_graph, planned_releases
+from src.Classes.buildAProfile import released_profiles, return_ref_dict, BuildContext
+from src.Classes.stageTimer import StageTimings
+from src.Classes.sitemapExtractor import sitemapUrls
+from src.Classes.websiteExtractor import websiteUrls
 
 def blockPrint():
     """Stops the output displaying on the terminal
@@ -26,6 +53,66 @@ def enablePrint():
     sys.stdout = sys.__stdout__
 
 
+class PageHandler(http.server.BaseHTTPRequestHandler):
+    """A local stand-in for the webpages, /flaky fails once before answering, /broken never answers"""
+    requests = collections.Counter()
+
+    def do_GET(self):
+        PageHandler.requests[self.path] += 1
+        if self.path.startswith("/broken"):
+            # the connection is closed without an answer
+            self.close_connection = True
+            return
+        if self.path == "/flaky" and PageHandler.requests[self.path] == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path.startswith("/etag"):
+            PageHandler.requests[self.headers.get("If-None-Match")] += 1
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+        body = ('<html><script type="application/ld+json">{"@type": "Dataset", "name": "%s"}</script></html>' % self.path).encode()
+        self.send_response(200)
+        if self.path.startswith("/etag"):
+            self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+SITEMAP_URLSET = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{}</urlset>'
+
+
+class SitemapHandler(http.server.BaseHTTPRequestHandler):
+    """A local stand-in for a website with a sitemap index, /slow.xml takes half a second to answer"""
+    requests = collections.Counter()
+    files = {
+        "/robots.txt": b"User-agent: *\nSitemap: /index.xml\n",
+        "/index.xml": ('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                       '<sitemap><loc>/slow.xml</loc></sitemap><sitemap><loc>/fast.xml.gz</loc></sitemap>'
+                       '<sitemap><loc>/index.xml</loc></sitemap></sitemapindex>').encode(),
+        "/slow.xml": SITEMAP_URLSET.format('<url><loc>http://pages/1</loc></url><url><loc>http://pages/2</loc></url>').encode(),
+        "/fast.xml.gz": gzip.compress(SITEMAP_URLSET.format('<url><loc>http://pages/2</loc></url><url><loc>http://pages/3</loc></url>').encode())}
+
+    def do_GET(self):
+        SitemapHandler.requests[self.path] += 1
+        if self.path == "/slow.xml":
+            time.sleep(0.5)
+        body = SitemapHandler.files.get(self.path)
+        self.send_response(200 if body is not None else 404)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+    def log_message(self, *args):
+        pass
+
+
 class TestUnits(unittest.TestCase):
     def testYmlToDictError(self):
         # assert testYmlToDictError() is None
@@ -44,6 +131,17 @@ class TestUnits(unittest.TestCase):
         self.assertIsNotNone(
             mapping,  "The mapping was not extracted")
         
+    def testYmlToDictProperty(self):
+        propertyInfo = "\n".join([
+            "author", "    expected_types:", "      - Person", "      - Organization",
+            "    description: The author", "    marginality: Minimum", "    cardinality: MANY",
+            "    controlled_vocab:", "    example: |-"])
+        self.assertEqual(tranform_yml_to_dict(propertyInfo),
+                         {"expected_types": ["Person", "Organization"], "marginality": "Minimum",
+                          "cardinality": "MANY", "controlled_vocab": ""})
+        # the values of the last block can end the yml
+        self.assertEqual(tranform_yml_to_dict("expected_types:\n  - Text")["expected_types"], ["Text"])
+
     def testCheckCompletenessNum(self):
         blockPrint()
         profileListDictPath = pathlib.Path("test/profile_lib/profile_marg.txt")
@@ -98,7 +196,480 @@ class TestUnits(unittest.TestCase):
         enablePrint()
         self.assertListEqual(propMinExist,
                             result["Minimum"]["Implemented"])
-        
+
+    def testValidatorCacheReuse(self):
+        cache = ValidatorCache(path_to_dict, 2)
+        profilePath = "profile_json/Dataset/0.3-RELEASE-2019_06_14.json"
+        schema, validator = cache.validator(profilePath)
+        self.assertIs(schema, cache.schema(profilePath)[0])
+        self.assertIs(validator, cache.validator(profilePath)[1])
+        strictSchema, strictValidator = cache.validator(profilePath, True)
+        self.assertIsNot(validator, strictValidator)
+        self.assertIn("propertyNames", strictSchema)
+        self.assertNotIn("propertyNames", schema)
+
+    def testValidatorCacheReferencedProfile(self):
+        cache = ValidatorCache(path_to_dict, 4)
+        blockPrint()
+        schema, validator = cache.validator("profile_json/Dataset/0.3-RELEASE-2019_06_14.json")
+        data = {"@type": "Dataset", "includedInDataCatalog": {"@type": "DataCatalog", "name": 1}}
+        errors = list(validator.iter_errors(data))
+        enablePrint()
+        self.assertEqual([list(e.path) for e in errors if len(e.path) != 0], [["includedInDataCatalog"]])
+        # the referenced profile is loaded from its own file, through the cache
+        self.assertEqual(len(cache), 2)
+        referenced, _ = cache.schema("profile_json/DataCatalog/0.2-RELEASE-2019_06_14.json")
+        self.assertNotIn("DataCatalog", schema["$defs"])
+        self.assertEqual(referenced["@type"], "DataCatalog")
+
+    def testValidatorCacheCopiedProfile(self):
+        # a profile copied out of profile_json still refers to the profiles in it
+        profilePath = pathlib.Path("profile_json/Dataset/0.3-RELEASE-2019_06_14.json")
+        data = {"@type": "Dataset", "creator": {"@type": "Person", "name": 1},
+                "includedInDataCatalog": {"@type": "DataCatalog", "name": 1}}
+        blockPrint()
+        expected = [e.message for e in ValidatorCache(path_to_dict, 4).validator(profilePath)[1].iter_errors(data)]
+        with tempfile.TemporaryDirectory() as tmp:
+            copyPath = pathlib.Path(tmp, "x.json")
+            copyPath.write_text(profilePath.read_text())
+            for compiledExt in (None, ".py"):
+                cache = ValidatorCache(path_to_dict, 4, compiledExt, config.PROFILE_LOC)
+                errors = [e.message for e in cache.validator(copyPath)[1].iter_errors(data)]
+                self.assertEqual(errors, expected)
+
+            # a $ref that cannot be loaded is reported as an error of the profile
+            schema = json.loads(profilePath.read_text())
+            schema["properties"]["includedInDataCatalog"] = {"$ref": "../Missing/0.1-RELEASE.json"}
+            copyPath.write_text(json.dumps(schema))
+            report = validation_report(data, schema, copyPath)
+        enablePrint()
+        self.assertFalse(report.valid)
+        self.assertEqual(report.errors[0][1], ("$ref",))
+        self.assertIn("Missing", report.errors[0][0])
+
+    def testCompiledValidatorSameErrors(self):
+        # differential test of the compiled profiles against jsonschema
+        values = ["text", 1, True, 0, None, 1.5, "2020-01-01", "http://x.org", [], {}, [1, "a"],
+                  {"@type": "Person", "name": "x"}, {"@type": "Foo"}, [{"@type": "Organization", "name": 3}],
+                  {"@type": "DataCatalog", "name": 1, "url": "nope"}, {"@type": "DefinedTerm", "url": "http://a"},
+                  {"@type": ["Person", 1]}]
+        # on a copy of the profiles, so the compiled sources are not written in the repository
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        profileLoc = pathlib.Path(tmp.name, "profile_json")
+        shutil.copytree("profile_json", profileLoc, ignore=shutil.ignore_patterns("*.py", "__pycache__"))
+        reference = ValidatorCache(path_to_dict, 256, None, profileLoc)
+        compiled = ValidatorCache(path_to_dict, 256, ".py", profileLoc)
+        blockPrint()
+        # the drafts as well, the latest one of a profile that was never released is used by default
+        for profilePath in sorted(profileLoc.glob("*/*.json")):
+            for schemaOrgNames in (False, True):
+                schema, expectedValidator = reference.validator(profilePath, schemaOrgNames)
+                _, validator = compiled.validator(profilePath, schemaOrgNames)
+                self.assertIsInstance(validator, CompiledValidator)
+                samples = [{}, {"Not CamelCase": 1}]
+                for propertyName in schema["properties"]:
+                    samples.extend({"@type": schema["@type"], propertyName: value} for value in values)
+                for data in samples:
+                    expected = [(e.message, list(e.path), list(e.schema_path), e.schema.get("validityCheck"))
+                                for e in expectedValidator.iter_errors(data)]
+                    result = [(e.message, list(e.path), list(e.schema_path), e.schema.get("validityCheck"))
+                              for e in validator.iter_errors(data)]
+                    self.assertEqual(result, expected, str(profilePath) + " " + str(data))
+        enablePrint()
+
+    def testCompiledValidatorSourceCache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profilePath = pathlib.Path(tmp, "Profile", "1.0-RELEASE.json")
+            referencedPath = pathlib.Path(tmp, "Other", "1.0-RELEASE.json")
+            profilePath.parent.mkdir()
+            referencedPath.parent.mkdir()
+            profilePath.write_text(json.dumps({"type": "object", "required": ["name"],
+                                               "properties": {"about": {"$ref": "../Other/1.0-RELEASE.json"}}}))
+            referencedPath.write_text(json.dumps({"type": "object"}))
+            blockPrint()
+            _, validator = ValidatorCache(path_to_dict, 4, ".py").validator(profilePath)
+            sourcePath = profilePath.with_suffix(".py")
+            source = sourcePath.read_text()
+            modified = sourcePath.stat().st_mtime_ns
+            self.assertTrue(validator.is_valid({"name": "x", "about": {}}))
+            self.assertFalse(validator.is_valid({"name": "x", "about": "text"}))
+
+            # kept while the profile and the profiles it refers to do not change
+            ValidatorCache(path_to_dict, 4, ".py").validator(profilePath)
+            self.assertEqual(sourcePath.stat().st_mtime_ns, modified)
+            referencedPath.write_text(json.dumps({"type": "string"}))
+            _, validator = ValidatorCache(path_to_dict, 4, ".py").validator(profilePath)
+            self.assertNotEqual(sourcePath.read_text(), source)
+            self.assertTrue(validator.is_valid({"name": "x", "about": "text"}))
+
+            # a keyword the compiler does not handle is left to jsonschema
+            profilePath.write_text(json.dumps({"type": "object", "minProperties": 1}))
+            _, validator = ValidatorCache(path_to_dict, 4, ".py").validator(profilePath)
+            enablePrint()
+            self.assertNotIsInstance(validator, CompiledValidator)
+            self.assertFalse(validator.is_valid({}))
+
+    def testValidatorCacheReloadAndEviction(self):
+        cache = ValidatorCache(path_to_dict, 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [pathlib.Path(tmp, str(i) + ".json") for i in range(3)]
+            for path in paths:
+                path.write_text(json.dumps({"type": "object"}))
+            first = cache.schema(paths[0])[0]
+            paths[0].write_text(json.dumps({"type": "array"}))
+            os.utime(paths[0], ns=(0, 0))
+            self.assertIsNot(first, cache.schema(paths[0])[0])
+            self.assertEqual(cache.schema(paths[0])[0]["type"], "array")
+            cache.schema(paths[1])
+            cache.schema(paths[2])
+            self.assertEqual(len(cache), 2)
+
+    def testProfileIndexLatestVersion(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profileDir = pathlib.Path(tmp, "json", "Gene")
+            margDir = pathlib.Path(tmp, "marg", "Gene")
+            profileDir.mkdir(parents=True)
+            margDir.mkdir(parents=True)
+            for version in ["0.3-DRAFT-2018_08_21", "0.4-RELEASE-2019_11_10", "0.6-DRAFT-2020_04_02"]:
+                profileDir.joinpath(version + ".json").write_text("{}")
+            margDir.joinpath("0.4-RELEASE-2019_11_10.txt").write_text("{}")
+            index = ProfileIndex(str(profileDir.parent), ".json", str(margDir.parent), ".txt")
+
+            self.assertIn("Gene", index)
+            self.assertNotIn("Protein", index)
+            self.assertEqual(index.versions("Gene")[0], "0.6-DRAFT-2020_04_02")
+            self.assertEqual(index.latest("Gene"), "0.4-RELEASE-2019_11_10")
+            self.assertEqual(index.latest_draft("Gene"), "0.6-DRAFT-2020_04_02")
+            self.assertIsNotNone(index.marginality_path("Gene", "0.4-RELEASE-2019_11_10"))
+            self.assertIsNone(index.marginality_path("Gene", "0.6-DRAFT-2020_04_02"))
+
+            profileDir.joinpath("0.7-RELEASE.json").write_text("{}")
+            os.utime(profileDir, ns=(0, 0))
+            self.assertEqual(index.latest("Gene"), "0.7-RELEASE")
+
+    def testValidationReportNoSideEffect(self):
+        data, dataPath = path_to_dict(
+            "test/metadata_lib/dataset_metadata/datasetMinimiumWith1ErrorProp.txt")
+        original = json.dumps(data, sort_keys=True)
+        report = validation_report(data)
+        self.assertEqual(original, json.dumps(data, sort_keys=True))
+        self.assertEqual(report.profileName, "Dataset")
+        self.assertFalse(report.valid)
+        self.assertEqual(report.errorProperties, {"keywords"})
+        self.assertIn("keywords", report.marginality["minimum"]["error"])
+        self.assertEqual(report.marginality_result("num")["Valid"], "False")
+
+    def testValidationReportNoProfile(self):
+        report = validation_report({"@type": ["Thing", "CreativeWork"]})
+        self.assertIsNone(report.profilePath)
+        self.assertEqual(len(report.notices), 1)
+        self.assertIsNone(report.marginality_result("num"))
+
+    def testDateSemanticCheckCorpus(self):
+        dataList = [
+            {"startDate": "2020-05-01", "endDate": "2020-01-01", "dateCreated": "2020-13-45",
+             "subjectOf": {"startDate": "2021-01-01", "endDate": "2019-01-01"}},
+            {"validFrom": "2020-01-01T00:00:00+02:00", "validThrough": "2019-12-31T23:00:00Z"},
+            {"startDate": "2019-01-01", "endDate": "2020-01-01"}]
+        warningsList = date_semantic_check_corpus(dataList)
+        self.assertEqual(warningsList, [date_semantic_check(data) for data in dataList])
+        self.assertEqual(len(warningsList[0]), 4)
+        self.assertEqual(warningsList[1], [])
+        self.assertEqual(warningsList[2], [])
+
+    def testLoadMetadataKeyWarnings(self):
+        data, warnings = load_metadata(
+            '{"name ": "a", "name": "b", "author": [{"given-name": "c"}], "http://purl.org/dc/terms/conformsTo": {}}')
+        # the first value of a duplicate property is kept
+        self.assertEqual(data, {"name": "a", "author": [{"given-name": "c"}], "http://purl.org/dc/terms/conformsTo": {}})
+        self.assertEqual(warnings, [KeyWarning("whitespace", "name ", ()),
+                                    KeyWarning("duplicate", "name", ()),
+                                    KeyWarning("character", "given-name", ("author",))])
+
+    def testProfileMarginalityCached(self):
+        index = ProfileIndex("profile_json", ".json", "profile_marginality", ".txt",
+                             "src/Classes/metadataDefaultPropName.txt")
+        marginality = index.marginality("ComputationalWorkflow", "1.0-RELEASE")
+        self.assertIs(marginality, index.marginality("ComputationalWorkflow", "1.0-RELEASE"))
+        self.assertIn("@type", marginality.default)
+        self.assertEqual(marginality.all, marginality.minimum | marginality.recommended | marginality.optional)
+
+        profileExistPath = pathlib.Path("test/profile_lib/profile_exist_prop.txt")
+        existProperty = profileExistPath.read_text().splitlines() + ["@type", "unknownProperty"]
+        profileListDict = json.loads(pathlib.Path("test/profile_lib/profile_marg.txt").read_text())
+        sets = ProfileMarginality(profileListDict, ["@type"]).sets(existProperty, ["name"])
+        self.assertEqual(sets["minimum"]["implemented"],
+                         set(existProperty).intersection(profileListDict["minimum"]))
+        self.assertIn("unknownProperty", sets["extra"])
+        self.assertNotIn("@type", sets["extra"])
+        profileProperty = set().union(*profileListDict.values())
+        self.assertEqual(sets["extra"], set(existProperty) - profileProperty - {"@type"})
+
+    def testScanJsonLdSameAsExtruct(self):
+        from extruct.jsonld import JsonLdExtractor
+        pages = [pathlib.Path("test/metadata_lib/HTMLwithJsonld.html").read_text(),
+                 '<SCRIPT TYPE="application/ld+json">[{"a": 1}, {}, {"b": 2}]</SCRIPT>',
+                 "<script data-type='x' type='application/ld+json'>\n// comment\n{\"c\": \"<!-- d -->\"}</script >",
+                 '<!-- <script type="application/ld+json">{"hidden": 1}</script> --><p>no JSON-LD</p>',
+                 '<script type="text/javascript">var a = "<script type=\'application/ld+json\'>";</script>']
+        for page in pages:
+            self.assertEqual(scanJsonLd(page), JsonLdExtractor().extract(page))
+        # extruct reports the invalid JSON-LD
+        self.assertIsNone(scanJsonLd('<script type="application/ld+json">{"a": </script>'))
+
+    def testLoadPageLocalFile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            htmlPath = pathlib.Path(directory, "page.html")
+            htmlPath.write_bytes('<html><script type="application/ld+json">{"name": "caf\u00e9"}</script></html>'.encode("utf-8"))
+            textPath = pathlib.Path(directory, "notes.txt")
+            textPath.write_bytes(b"no tag\r\nhere")
+            mmapSize = config.LOCAL_HTML_MMAP_SIZE
+            try:
+                # the same JSON-LD whether the file is read or memory-mapped
+                for size in [0, 1]:
+                    config.LOCAL_HTML_MMAP_SIZE = size
+                    page = loadPage(None, str(htmlPath))
+                    self.assertEqual(page["source"], "local")
+                    self.assertEqual(page["outputName"], "page")
+                    self.assertEqual(extractData(page["html"], page["url"]), {"json-ld": [{"name": "caf\u00e9"}]})
+                    closeHtml(page["html"])
+            finally:
+                config.LOCAL_HTML_MMAP_SIZE = mmapSize
+            page = loadPage(None, str(textPath))
+            self.assertEqual(page["source"], "other")
+            self.assertEqual(htmlText(page["html"]), "no tag\nhere")
+
+    def testHttpFetcherConcurrentRetry(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = "http://127.0.0.1:" + str(server.server_address[1])
+        links = [base + "/page" + str(i) for i in range(10)] + [base + "/flaky"]
+        try:
+            with HttpFetcher(4, 5, 2, 0) as fetcher:
+                pages = list(fetcher.map(loadPage, links))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual([page["url"] for page in pages], links)
+        self.assertTrue(all(page["error"] is None for page in pages))
+        self.assertIn('"name": "/page3"', pages[3]["html"])
+        self.assertEqual(pages[3]["outputName"], "page3")
+        self.assertEqual(PageHandler.requests["/flaky"], 2)
+
+        # nothing listens on the port of the server once it is closed
+        with HttpFetcher(1, 1, 0, 0) as fetcher:
+            page = loadPage(fetcher, base + "/page0")
+        self.assertIsNotNone(page["error"])
+
+    def testExtractEveryDownloadFailed(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = "http://127.0.0.1:" + str(server.server_address[1])
+        retries, cacheLoc = config.HTTP_RETRIES, config.HTTP_CACHE_LOC
+        config.HTTP_RETRIES, config.HTTP_CACHE_LOC = 0, ""
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                linksPath = pathlib.Path(directory, "links.txt")
+                linksPath.write_text(base + "/broken1\n" + base + "/broken2\n")
+                blockPrint()
+                result = extract(linksPath)
+                enablePrint()
+        finally:
+            config.HTTP_RETRIES, config.HTTP_CACHE_LOC = retries, cacheLoc
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(result, [])
+
+    def testHttpCacheRevalidation(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = "http://127.0.0.1:" + str(server.server_address[1])
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                with HttpFetcher(2, 5, 0, 0, HttpCache(directory, 1000)) as fetcher:
+                    first = fetcher.get(base + "/etag1")
+                    self.assertFalse(first.cached)
+                    # without ETag or Last-Modified the webpage is not kept
+                    fetcher.get(base + "/page0")
+                    self.assertEqual(len(fetcher.cache), 1)
+
+                # the next run revalidates the webpage kept on disk
+                cache = HttpCache(directory, 1000)
+                with HttpFetcher(2, 5, 0, 0, cache) as fetcher:
+                    second = fetcher.get(base + "/etag1")
+                self.assertTrue(second.cached)
+                self.assertEqual(second.text, first.text)
+                self.assertEqual(PageHandler.requests['"v1"'], 1)
+
+                # the least recently used webpage is removed once the cache is full
+                cache = HttpCache(directory, len(first.text) * 2)
+                with HttpFetcher(1, 5, 0, 0, cache) as fetcher:
+                    fetcher.get(base + "/etag2")
+                    fetcher.get(base + "/etag3")
+                self.assertIsNone(cache.get(base + "/etag1"))
+                self.assertIsNotNone(cache.get(base + "/etag3"))
+                self.assertEqual(len(list(pathlib.Path(directory).iterdir())), 3)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def testValidationServer(self):
+        server = ValidationServer(("127.0.0.1", 0), quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        dataPath = "test/metadata_lib/dataset_metadata/datasetMinimium.txt"
+        text = pathlib.Path(dataPath).read_text()
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+            connection.request("POST", "/validate?csv=num", body=text.encode("utf-8"))
+            response = connection.getresponse()
+            single = json.loads(response.read())
+            self.assertEqual(response.status, 200)
+            # a batch in JSON Lines gets one result per line
+            connection.request("POST", "/validate?csv=name", body=(json.dumps(json.loads(text)) + "\n[1]\n").encode("utf-8"),
+                               headers={"Content-Type": "application/x-ndjson"})
+            response = connection.getresponse()
+            batch = json.loads(response.read())
+            connection.request("POST", "/validate?profile=Dataset/0.3-RELEASE-2019_06_14", body=text.encode("utf-8"))
+            response = connection.getresponse()
+            named = json.loads(response.read())
+            self.assertEqual(response.status, 200)
+            # a profile can only be asked for by its name and version in config.PROFILE_LOC, not by a path
+            with tempfile.TemporaryDirectory() as tmp:
+                outsidePath = pathlib.Path(tmp, "x.json")
+                outsidePath.write_text(pathlib.Path("profile_json/Dataset/0.3-RELEASE-2019_06_14.json").read_text())
+                for profile in [str(outsidePath), "profile_json/Dataset/0.3-RELEASE-2019_06_14.json",
+                                "../profile_json/Dataset/0.3-RELEASE-2019_06_14", "/etc/passwd", "Dataset/missing"]:
+                    connection.request("POST", "/validate?profile=" + quote(profile), body=text.encode("utf-8"))
+                    response = connection.getresponse()
+                    rejected = json.loads(response.read())
+                    self.assertEqual(response.status, 400, profile)
+                    self.assertNotIn(profile, rejected["error"])
+                self.assertEqual(list(pathlib.Path(tmp).iterdir()), [outsidePath])
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        blockPrint()
+        data = path_to_dict(dataPath)[0]
+        expectedNum = validate(data, "num")
+        expectedName = validate(data, "name")
+        enablePrint()
+        self.assertEqual(single["profileName"], "Dataset")
+        self.assertEqual(named["profileVersion"], "0.3-RELEASE-2019_06_14.json")
+        self.assertEqual(single["marginality"], expectedNum)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch[0]["marginality"], expectedName)
+        self.assertIn("error", batch[1])
+
+    def testValidationServerNotUtf8(self):
+        server = ValidationServer(("127.0.0.1", 0), quiet=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+            connection.request("POST", "/validate", body=b"\xff")
+            response = connection.getresponse()
+            result = json.loads(response.read())
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(response.status, 400)
+        self.assertIn("UTF-8", result["error"])
+
+    def testBuildLevels(self):
+        # b and c reference each other, so they are built together after a
+        levels = build_levels({"a": set(), "b": {"a", "c"}, "c": {"b"}, "d": {"c"}, "e": set()})
+        self.assertEqual(levels, [["a", "e"], ["b", "c"], ["d"]])
+
+        paths = sorted(pathlib.Path("profile_yml").glob("**/*.html"))
+        graph = dependency_graph(paths)
+        levelOf = {path: number for number, members in enumerate(build_levels(graph)) for path in members}
+        self.assertEqual(sorted(levelOf), paths)
+        for path, dependencies in graph.items():
+            for dependency in dependencies:
+                self.assertIn("RELEASE", dependency.name)
+                self.assertLessEqual(levelOf[dependency], levelOf[path])
+        # the profiles in the repository are already built
+        self.assertEqual(planned_releases(paths), released_profiles())
+
+    def testReturnRefDictMemoized(self):
+        context = BuildContext(pathlib.Path("profile_yml/Dataset/0.3-RELEASE-2019_06_14.html"),
+                               {"Person": "0.9-RELEASE.json"})
+        context.title = "author"
+        ref = return_ref_dict("Person", False, context)
+        self.assertEqual(ref["$ref"], "../Person/0.9-RELEASE.json")
+        self.assertEqual(list(context.refs), [("Person", False)])
+        again = return_ref_dict("Person", False, context)
+        self.assertEqual(again, ref)
+        self.assertIsNot(again, ref)
+        # the title is a link to the profile itself, whatever was made for the type before
+        context.title = "Person"
+        self.assertEqual(return_ref_dict("Person", False, context)["$ref"], "#/")
+
+    def testStageTimings(self):
+        timings = StageTimings()
+        # nothing is kept until the timings are enabled
+        with timings.record():
+            with timings.stage("load"):
+                timings.profile("Dataset")
+        self.assertEqual(timings.summary(), [])
+
+        timings.enable()
+        for n in range(100):
+            with timings.record():
+                timings.add("load", n / 1000)
+                timings.profile("Dataset" if n % 2 == 0 else "Person")
+        timings.add("csv", 0.5)
+        worker = StageTimings()
+        worker.enable()
+        with worker.record():
+            worker.add("load", 1)
+            worker.profile("Dataset")
+        timings.merge(worker.drain())
+        self.assertEqual(worker.summary(), [])
+
+        rows = {(row["stage"], row["profile"]): row for row in timings.summary()}
+        self.assertEqual(list(rows), [("load", "Dataset"), ("load", "Person"), ("csv", "")])
+        dataset = rows[("load", "Dataset")]
+        self.assertEqual(dataset["count"], 51)
+        self.assertEqual(dataset["p50"], 0.05)
+        self.assertEqual(dataset["p95"], 0.096)
+        self.assertEqual(dataset["p99"], 1)
+        self.assertEqual(rows[("csv", "")]["total"], 0.5)
+
+    def testSitemapUrlsRecursive(self):
+        urlset = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{}</urlset>'
+        with tempfile.TemporaryDirectory() as directory:
+            directory = pathlib.Path(directory)
+            (directory / "index.xml").write_text(
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                '<sitemap><loc>https://example.org/a.xml</loc></sitemap>'
+                '<sitemap><loc>b.xml.gz</loc></sitemap></sitemapindex>')
+            # the local copy of a sitemap is read instead of downloading it
+            (directory / "a.xml").write_text(urlset.format('<url><loc> https://example.org/1 </loc></url>'))
+            # a sitemap listing the sitemap index is not read again
+            with gzip.open(directory / "b.xml.gz", "wt") as f:
+                f.write(urlset.format('<url><loc>https://example.org/2</loc></url><sitemap><loc>index.xml</loc></sitemap>'))
+            blockPrint()
+            urls = list(sitemapUrls(directory / "index.xml"))
+            enablePrint()
+        self.assertEqual(urls, ["https://example.org/1", "https://example.org/2"])
+
+    def testWebsiteUrlsConcurrent(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SitemapHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with HttpFetcher(4, 5, 0, 0) as fetcher:
+                blockPrint()
+                urls = list(websiteUrls("http://127.0.0.1:" + str(server.server_address[1]) + "/about", fetcher))
+                enablePrint()
+        finally:
+            server.shutdown()
+            server.server_close()
+        # the urls of the fast sitemap come first, each url and each sitemap only once
+        self.assertEqual(urls, ["http://pages/2", "http://pages/3", "http://pages/1"])
+        self.assertEqual(SitemapHandler.requests["/index.xml"], 1)
 
 
 if __name__ == '__main__':